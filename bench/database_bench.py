@@ -0,0 +1,351 @@
+"""Micro-benchmarks for database.py.
+
+Seeds a throwaway hr_bot.db and times every public database function the
+way handlers call it (through the async pool), e.g.
+
+    python bench/database_bench.py --users 5000 --requests 500000 --feedback 100000
+    python bench/database_bench.py --output after.json --compare before.json
+
+Results are printed as a table and written as JSON for comparison between
+commits. Nothing here needs network access.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+CATEGORIES = [
+    "Техніка або матеріали",
+    "Відпустка",
+    "Лікарняний",
+    "Довідка",
+    "Інше",
+]
+DEPARTMENTS = ["IT", "HR", "Фінанси", "Продажі", "Логістика", "Маркетинг"]
+PROCESSED = ["✅ Схвалено", "❌ Відхилено"]
+# pending outbox messages, one chat each, for the claim/ack/retry/release/fail cases
+OUTBOX_ROWS = 20000
+
+
+def seed(path: str, users: int, hrs: int, requests: int, feedback: int, pending_ratio: float, rnd: random.Random) -> None:
+    # Bulk-loads directly with sqlite3: going through the async writers
+    # would make seeding half a million rows take minutes.
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO users (telegram_id, full_name, department, position, username) VALUES (?, ?, ?, ?, ?)",
+        ((100000 + i, f"Співробітник {i}", rnd.choice(DEPARTMENTS), f"Посада {i % 40}", f"user{i}")
+         for i in range(users))
+    )
+    conn.executemany(
+        "INSERT INTO roles (telegram_id, role) VALUES (?, 'hr')",
+        ((100000 + i,) for i in range(min(hrs, users)))
+    )
+    start = datetime(2023, 1, 1)
+    step = timedelta(days=3 * 365) / max(requests, 1)
+
+    def request_rows():
+        for i in range(requests):
+            created = start + step * i
+            if rnd.random() < pending_ratio:
+                yield (100000 + rnd.randrange(users), i + 1, rnd.choice(CATEGORIES), f"Текст заявки {i}",
+                       "Відправлено", None, None, created.isoformat(timespec="seconds"), None)
+            else:
+                yield (100000 + rnd.randrange(users), i + 1, rnd.choice(CATEGORIES), f"Текст заявки {i}",
+                       rnd.choice(PROCESSED), f"Коментар {i}", 100000 + rnd.randrange(max(hrs, 1)),
+                       created.isoformat(timespec="seconds"),
+                       (created + timedelta(hours=rnd.randrange(1, 72))).isoformat(timespec="seconds"))
+
+    conn.executemany('''
+        INSERT INTO requests
+          (user_id, request_number, category, text, status, response, assigned_hr_id, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', request_rows())
+    conn.execute(
+        "UPDATE counters SET value = ? WHERE name = 'request_number'",
+        (requests,)
+    )
+    fb_step = timedelta(days=3 * 365) / max(feedback, 1)
+
+    def feedback_rows():
+        for i in range(feedback):
+            created = start + fb_step * i
+            answered = rnd.random() >= pending_ratio
+            yield (100000 + rnd.randrange(users), f"Відгук {i}",
+                   f"Відповідь {i}" if answered else None,
+                   100000 + rnd.randrange(max(hrs, 1)) if answered else None,
+                   created.isoformat(timespec="seconds"),
+                   (created + timedelta(hours=5)).isoformat(timespec="seconds") if answered else None)
+
+    conn.executemany('''
+        INSERT INTO anonymous_feedback
+          (user_id, text, response, assigned_hr_id, created_at, responded_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', feedback_rows())
+    conn.executemany(
+        "INSERT INTO outbox (chat_id, method, payload, available_at, created_at) VALUES (?, 'SendMessage', ?, 0, ?)",
+        ((10 ** 8 + i, f'{{"chat_id":{10 ** 8 + i},"text":"Бенчмарк"}}', start.isoformat(timespec="seconds"))
+         for i in range(OUTBOX_ROWS))
+    )
+    conn.executemany(
+        "INSERT INTO hr_tokens (token, is_used) VALUES (?, 0)",
+        ((f"bench{i:06d}",) for i in range(10000))
+    )
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Bench:
+    def __init__(self, users: int, hrs: int, requests: int, feedback: int, rnd: random.Random):
+        self.users = users
+        self.hrs = hrs
+        self.requests = requests
+        self.feedback = feedback
+        self.rnd = rnd
+        self.pending_requests: List[int] = []
+        self.pending_feedback: List[int] = []
+        self.tokens = [f"bench{i:06d}" for i in range(10000)]
+        self.new_users = iter(range(10 ** 7, 2 * 10 ** 7))
+        self.added_users: List[int] = []
+        self.leased: List[int] = []
+
+    def user(self) -> int:
+        return 100000 + self.rnd.randrange(self.users)
+
+    def request(self) -> int:
+        return self.rnd.randrange(1, self.requests + 1)
+
+    def cases(self) -> List[Tuple[str, Callable[[], Awaitable[Any]], Optional[int]]]:
+        # (name, call, iterations override for full-table reads)
+        r = self.rnd
+        return [
+            ("get_user_role", lambda: database.get_user_role(self.user()), None),
+            ("has_hr_access", lambda: database.has_hr_access(self.user()), None),
+            ("get_all_hr_ids", lambda: database.get_all_hr_ids(), None),
+            ("is_token_valid", lambda: database.is_token_valid(r.choice(self.tokens)), None),
+            ("get_user", lambda: database.get_user(self.user()), None),
+            ("get_all_users", lambda: database.get_all_users(), 20),
+            ("get_users_and_roles", lambda: database.get_users_and_roles(), 20),
+            ("get_counter", lambda: database.get_counter("pending"), None),
+            ("get_new_requests", lambda: database.get_new_requests(), 20),
+            ("get_new_feedback", lambda: database.get_new_feedback(), 20),
+            ("get_pending_items", lambda: database.get_pending_items(), 20),
+            ("get_pending_request", lambda: database.get_pending_request(r.choice(self.pending_requests or [1])), None),
+            ("get_pending_feedback", lambda: database.get_pending_feedback(r.choice(self.pending_feedback or [1])), None),
+            ("get_user_requests", lambda: database.get_user_requests(self.user()), None),
+            ("get_user_feedback", lambda: database.get_user_feedback(self.user()), None),
+            ("get_request", lambda: database.get_request(self.request()), None),
+            ("get_feedback_user", lambda: database.get_feedback_user(r.randrange(1, self.feedback + 1)), None),
+            ("get_processed_requests(limit=10)", lambda: database.get_processed_requests(10), None),
+            ("get_processed_requests(limit=None)", lambda: database.get_processed_requests(None), 3),
+            ("get_processed_feedbacks(limit=10)", lambda: database.get_processed_feedbacks(10), None),
+            ("get_processed_feedbacks(limit=None)", lambda: database.get_processed_feedbacks(None), 3),
+            ("get_hr_history_page", lambda: database.get_hr_history_page(database.HISTORY_START, False, 10), None),
+            ("get_user_history_page", lambda: database.get_user_history_page(self.user(), database.HISTORY_START, False, 10), None),
+            ("search_items(one word)", lambda: database.search_items(str(r.randrange(self.requests))), None),
+            ("search_items(two words)", lambda: database.search_items(f"заявки {r.randrange(self.requests)}"), None),
+            ("search_items(filtered)", lambda: database.search_items(
+                f"заявки {r.randrange(self.requests)}", category=r.choice(CATEGORIES), status="Відправлено"), None),
+            ("search_items(every row)", lambda: database.search_items("текст"), 3),
+            ("get_fsm_record", lambda: database.get_fsm_record(f"fsm:{self.user()}:{self.user()}"), None),
+            ("add_user", self._add_user, None),
+            ("delete_user", self._delete_user, None),
+            ("set_username", lambda: database.set_username(self.user(), f"u{r.randrange(10 ** 6)}"), None),
+            ("update_user_info", lambda: database.update_user_info(self.user(), "Ім'я", "IT", "Dev"), None),
+            ("add_hr", lambda: database.add_hr(self.user()), None),
+            ("generate_hr_token", lambda: database.generate_hr_token(), None),
+            ("mark_token_as_used", lambda: database.mark_token_as_used(r.choice(self.tokens)), None),
+            ("add_request", lambda: database.add_request(self.user(), r.choice(CATEGORIES), "Бенчмарк"), None),
+            ("update_request_status", self._process_request, None),
+            ("add_anonymous_feedback", lambda: database.add_anonymous_feedback(self.user(), "Бенчмарк"), None),
+            ("add_feedback_response", self._answer_feedback, None),
+            ("save_fsm_records", lambda: database.save_fsm_records(
+                [(f"fsm:{self.user()}:{self.user()}", "RequestState:confirm", '{"category":"Інше"}')]), None),
+            ("claim_outbox", self._claim_outbox, None),
+            ("ack_outbox", lambda: self._leased_outbox(database.ack_outbox), None),
+            ("retry_outbox", lambda: self._leased_outbox(database.retry_outbox, 60, "Бенчмарк"), None),
+            ("release_outbox", lambda: self._leased_outbox(database.release_outbox), None),
+            ("fail_outbox", lambda: self._leased_outbox(database.fail_outbox, "Бенчмарк"), None),
+        ]
+
+    async def _add_user(self):
+        telegram_id = next(self.new_users)
+        self.added_users.append(telegram_id)
+        return await database.add_user(telegram_id, "Новий", "IT", "Dev", None)
+
+    async def _delete_user(self):
+        # Deletes the users add_user created, so the seeded ones stay
+        telegram_id = self.added_users.pop() if self.added_users else next(self.new_users)
+        return await database.delete_user(telegram_id)
+
+    async def _claim_outbox(self):
+        rows = await database.claim_outbox(50, 60)
+        self.leased += [row[0] for row in rows]
+        return rows
+
+    async def _leased_outbox(self, call, *args):
+        # ack/retry/release/fail one message claim_outbox leased
+        if not self.leased:
+            self.leased = [row[0] for row in await database.claim_outbox(50, 60)]
+        return await call([self.leased.pop()] if self.leased else [], *args)
+
+    async def _process_request(self):
+        request_id = self.pending_requests.pop() if self.pending_requests else self.request()
+        return await database.update_request_status(request_id, self.rnd.choice(PROCESSED), "Бенчмарк", self.user())
+
+    async def _answer_feedback(self):
+        feedback_id = self.pending_feedback.pop() if self.pending_feedback else self.rnd.randrange(1, self.feedback + 1)
+        return await database.add_feedback_response(feedback_id, "Бенчмарк", self.user())
+
+    async def run(self, iterations: int, warmup: int, only: Optional[List[str]]) -> Dict[str, Dict[str, float]]:
+        rows, _ = await database.get_pending_items()
+        self.pending_requests = [row[1] for row in rows if row[0] == "r"]
+        self.pending_feedback = [row[1] for row in rows if row[0] == "f"]
+        self.rnd.shuffle(self.pending_requests)
+        self.rnd.shuffle(self.pending_feedback)
+
+        results = {}
+        for name, call, override in self.cases():
+            if only and not any(part in name for part in only):
+                continue
+            n = min(override, iterations) if override else iterations
+            for _ in range(min(warmup, n)):
+                await call()
+            samples = []
+            started = time.perf_counter()
+            for _ in range(n):
+                t = time.perf_counter()
+                await call()
+                samples.append(time.perf_counter() - t)
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                "n": n,
+                "p50_ms": percentile(samples, 50) * 1000,
+                "p95_ms": percentile(samples, 95) * 1000,
+                "p99_ms": percentile(samples, 99) * 1000,
+                "mean_ms": sum(samples) / n * 1000,
+                "ops_per_sec": n / elapsed if elapsed else 0.0,
+            }
+            print_row(name, results[name])
+        return results
+
+
+def print_row(name: str, r: Dict[str, float], baseline: Optional[Dict[str, float]] = None) -> None:
+    line = (f"{name:<38} {r['n']:>6} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} "
+            f"{r['p99_ms']:>10.3f} {r['ops_per_sec']:>10.1f}")
+    if baseline:
+        line += f"   p50 x{r['p50_ms'] / baseline['p50_ms']:.2f}  p95 x{r['p95_ms'] / baseline['p95_ms']:.2f}"
+    print(line, flush=True)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args: argparse.Namespace) -> None:
+    rnd = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="hr_bot_bench_")
+    database.DB_PATH = os.path.join(workdir, database.DB_NAME)
+
+    database.init_db()
+    database.close_db()
+    started = time.perf_counter()
+    seed(database.DB_PATH, args.users, args.hrs, args.requests, args.feedback, args.pending_ratio, rnd)
+    print(f"Seeded {database.DB_PATH} in {time.perf_counter() - started:.1f}s")
+    database.init_db()
+
+    print(f"\n{'function':<38} {'n':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>10}")
+    try:
+        results = await Bench(args.users, args.hrs, args.requests, args.feedback, rnd).run(
+            args.iterations, args.warmup, args.only
+        )
+    finally:
+        database.close_db()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "volumes": {
+                "users": args.users,
+                "hrs": args.hrs,
+                "requests": args.requests,
+                "feedback": args.feedback,
+                "pending_ratio": args.pending_ratio,
+            },
+            "iterations": args.iterations,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"\nCompared with {args.compare}:")
+        for name, r in results.items():
+            if name in baseline:
+                print_row(name, r, baseline[name])
+
+    if not args.keep:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(database.DB_PATH + suffix)
+            except FileNotFoundError:
+                pass
+        os.rmdir(workdir)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark database.py against a seeded hr_bot.db")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--hrs", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500000)
+    parser.add_argument("--feedback", type=int, default=100000)
+    parser.add_argument("--pending-ratio", type=float, default=0.01,
+                        help="share of requests/feedback still waiting for HR")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="*", help="run only functions whose name contains one of these")
+    parser.add_argument("--output", default="bench_database.json")
+    parser.add_argument("--compare", help="earlier JSON output to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded database")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,485 @@
+"""End-to-end load generator for the bot.
+
+Builds the real dispatcher from bot.create_dispatcher() on a throwaway
+hr_bot.db and feeds it synthetic updates through dp.feed_update. The Bot
+API is replaced by a local session that records every call, adds latency
+and answers a share of calls with 429. For example
+
+    python bench/load_dispatcher.py --rate 50 --duration 60
+    python bench/load_dispatcher.py --rate 200 --api-latency 80 --flood-ratio 0.01 --output load.json
+
+Reports handler latency per step, Bot API calls per update and event loop
+lag. Nothing here talks to Telegram.
+"""
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+from aiogram.methods import TelegramMethod  # noqa: E402
+from aiogram.types import (  # noqa: E402
+    CallbackQuery,
+    Chat,
+    InlineKeyboardMarkup,
+    Message,
+    PhotoSize,
+    Update,
+    User
+)
+
+import database  # noqa: E402
+
+BOT_ID = 42
+CATEGORIES = ["Техніка або матеріали", "Відпустка", "Лікарняний", "Довідка", "Інше"]
+
+# Bot API calls made while handling the update of the current task; calls
+# outside any update (outbox worker, FSM flushes) count as background.
+_api_calls: contextvars.ContextVar[Optional[Counter]] = contextvars.ContextVar("api_calls", default=None)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class StubSession(BaseSession):
+    def __init__(self, latency: float, jitter: float, flood_ratio: float, retry_after: int, rnd: random.Random):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_ratio = flood_ratio
+        self.retry_after = retry_after
+        self.rnd = rnd
+        self.calls: Counter = Counter()
+        self.background: Counter = Counter()
+        self.flooded = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # last inline keyboard and text sent to every chat, read by the scripts
+        self.keyboards: Dict[int, InlineKeyboardMarkup] = {}
+        self.texts: Dict[int, str] = {}
+        self._message_ids = itertools.count(1)
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    def _message(self, chat_id: int, text: Optional[str] = None) -> Message:
+        return Message(
+            message_id=next(self._message_ids),
+            date=datetime.now(),
+            chat=Chat(id=chat_id, type="private"),
+            text=text
+        )
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] += 1
+        counter = _api_calls.get()
+        (counter if counter is not None else self.background)[name] += 1
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(max(0.0, self.rnd.gauss(self.latency, self.jitter)))
+        finally:
+            self.in_flight -= 1
+        if self.flood_ratio and self.rnd.random() < self.flood_ratio:
+            self.flooded += 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=self.retry_after)
+
+        chat_id = getattr(method, "chat_id", None)
+        if isinstance(chat_id, int):
+            markup = getattr(method, "reply_markup", None)
+            if isinstance(markup, InlineKeyboardMarkup):
+                self.keyboards[chat_id] = markup
+            text = getattr(method, "text", None)
+            if text:
+                self.texts[chat_id] = text
+
+        if name == "GetMe":
+            return User(id=BOT_ID, is_bot=True, first_name="bot", username="hr_bot")
+        if name == "GetChat":
+            return Chat(id=chat_id, type="private", username=f"user{chat_id}")
+        if name == "SendMediaGroup":
+            return [self._message(chat_id) for _ in method.media]
+        if name.startswith(("Send", "Edit")):
+            return self._message(chat_id if isinstance(chat_id, int) else 0, getattr(method, "text", None))
+        return True
+
+
+class Load:
+    def __init__(self, args: argparse.Namespace, dp, bot: Bot, session: StubSession, rnd: random.Random):
+        self.args = args
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.rnd = rnd
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(10 ** 6)
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.api_per_update: List[int] = []
+        self.errors: Counter = Counter()
+        self.flows: Counter = Counter()
+        self.updates = 0
+        self.free_employees: List[int] = []
+        self.free_hrs: List[int] = []
+        self.new_users = itertools.count(5 * 10 ** 6)
+        self.tokens: List[str] = []
+
+    # --- synthetic updates -------------------------------------------------
+
+    def _user(self, uid: int) -> User:
+        return User(id=uid, is_bot=False, first_name="Load", username=f"load{uid}")
+
+    def message(self, uid: int, text: Optional[str] = None, **extra) -> Update:
+        return Update(update_id=next(self.update_ids), message=Message(
+            message_id=next(self.message_ids),
+            date=datetime.now(),
+            chat=Chat(id=uid, type="private"),
+            from_user=self._user(uid),
+            text=text,
+            **extra
+        ))
+
+    def callback(self, uid: int, data: str) -> Update:
+        shown = Message(
+            message_id=next(self.message_ids),
+            date=datetime.now(),
+            chat=Chat(id=uid, type="private"),
+            from_user=User(id=BOT_ID, is_bot=True, first_name="bot"),
+            text=self.session.texts.get(uid, "…")
+        )
+        return Update(update_id=next(self.update_ids), callback_query=CallbackQuery(
+            id=str(next(self.update_ids)),
+            from_user=self._user(uid),
+            chat_instance="load",
+            data=data,
+            message=shown
+        ))
+
+    def button(self, uid: int, prefix: str) -> Optional[str]:
+        markup = self.session.keyboards.get(uid)
+        if markup is None:
+            return None
+        for row in markup.inline_keyboard:
+            for button in row:
+                if button.callback_data and button.callback_data.startswith(prefix):
+                    return button.callback_data
+        return None
+
+    async def feed(self, step: str, update: Update) -> None:
+        counter = Counter()
+        token = _api_calls.set(counter)
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.errors[f"{step}: {type(e).__name__}"] += 1
+        finally:
+            self.latency[step].append(time.perf_counter() - started)
+            self.api_per_update.append(sum(counter.values()))
+            self.updates += 1
+            _api_calls.reset(token)
+
+    async def think(self) -> None:
+        if self.args.think:
+            await asyncio.sleep(self.rnd.expovariate(1 / self.args.think))
+
+    # --- scripted flows ----------------------------------------------------
+
+    async def registration(self) -> None:
+        uid = next(self.new_users)
+        token = self.tokens.pop() if self.tokens else "invalid"
+        for step, text in (
+            ("register:start", "/start"),
+            ("register:button", "Реєстрація"),
+            ("register:token", token),
+            ("register:name", f"Співробітник {uid}"),
+            ("register:department", self.rnd.choice(["IT", "Фінанси", "Продажі"])),
+            ("register:position", "Спеціаліст"),
+        ):
+            await self.feed(step, self.message(uid, text))
+            await self.think()
+        self.free_employees.append(uid)
+
+    async def submit_request(self, uid: int) -> None:
+        await self.feed("request:menu", self.message(uid, "📩 Подати заявку"))
+        await self.think()
+        await self.feed("request:category", self.message(uid, self.rnd.choice(CATEGORIES)))
+        await self.think()
+        if self.rnd.random() < self.args.media_ratio:
+            group = f"g{next(self.update_ids)}"
+            await asyncio.gather(*(
+                self.feed("request:album_part", self.message(
+                    uid,
+                    photo=[PhotoSize(file_id=f"photo{uid}_{i}", file_unique_id=f"u{uid}_{i}", width=800, height=600)],
+                    media_group_id=group,
+                    caption="Фото до заявки" if i == 0 else None
+                ))
+                for i in range(self.rnd.randint(2, 4))
+            ))
+        else:
+            await self.feed("request:text", self.message(uid, f"Потрібен ноутбук, заявка від {uid}"))
+        await self.think()
+        await self.feed("request:confirm", self.callback(uid, "send_request"))
+
+    async def employee_history(self, uid: int) -> None:
+        await self.feed("history:user", self.message(uid, "📑 Перевірити статус моєї заяви"))
+        for _ in range(self.rnd.randint(0, 3)):
+            data = self.button(uid, "user_history_next_")
+            if data is None:
+                break
+            await self.think()
+            await self.feed("history:user_next", self.callback(uid, data))
+
+    async def hr_review(self, uid: int) -> None:
+        await self.feed("hr:queue", self.message(uid, "📥 Нові заявки"))
+        data = self.button(uid, "pending_open_r_")
+        if data is None:
+            return
+        await self.think()
+        await self.feed("hr:open", self.callback(uid, data))
+        action = "approve_" if self.rnd.random() < 0.7 else "reject_"
+        data = self.button(uid, action)
+        if data is None:
+            return
+        await self.think()
+        await self.feed("hr:decide", self.callback(uid, data))
+
+    async def hr_history(self, uid: int) -> None:
+        await self.feed("history:hr", self.message(uid, "📜 Історія заявок"))
+        for _ in range(self.rnd.randint(0, 3)):
+            data = self.button(uid, "hr_history_next_")
+            if data is None:
+                break
+            await self.think()
+            await self.feed("history:hr_next", self.callback(uid, data))
+
+    FLOWS = {
+        # name: (weight option, expected updates per flow, runs as)
+        "registration": ("w_register", 6, None),
+        "request": ("w_request", 4.6, "employee"),
+        "user_history": ("w_user_history", 2.5, "employee"),
+        "hr_review": ("w_hr_review", 3, "hr"),
+        "hr_history": ("w_hr_history", 2.5, "hr"),
+    }
+
+    async def run_flow(self, name: str) -> None:
+        # A user runs one flow at a time, like a real person would, so FSM
+        # states of concurrent flows never collide.
+        _, _, role = self.FLOWS[name]
+        pool = self.free_employees if role == "employee" else self.free_hrs
+        if role is not None and not pool:
+            self.flows["skipped (no idle user)"] += 1
+            return
+        uid = pool.pop(self.rnd.randrange(len(pool))) if role else None
+        self.flows[name] += 1
+        try:
+            if name == "registration":
+                await self.registration()
+            elif name == "request":
+                await self.submit_request(uid)
+            elif name == "user_history":
+                await self.employee_history(uid)
+            elif name == "hr_review":
+                await self.hr_review(uid)
+            else:
+                await self.hr_history(uid)
+        finally:
+            if role is not None:
+                pool.append(uid)
+
+    async def drive(self) -> float:
+        names = list(self.FLOWS)
+        weights = [getattr(self.args, self.FLOWS[n][0]) for n in names]
+        mean_updates = sum(w * self.FLOWS[n][1] for n, w in zip(names, weights)) / sum(weights)
+        flow_rate = self.args.rate / mean_updates
+
+        tasks = set()
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        next_at = started
+        while True:
+            next_at += self.rnd.expovariate(flow_rate)
+            if next_at >= deadline:
+                break
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            task = asyncio.create_task(self.run_flow(self.rnd.choices(names, weights)[0]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        return time.perf_counter() - started
+
+
+async def monitor_loop_lag(samples: List[float], interval: float = 0.05) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def seed(employees: int, hrs: int, tokens: int) -> Dict[str, List]:
+    employee_ids = [10 ** 6 + i for i in range(employees)]
+    hr_ids = [2 * 10 ** 6 + i for i in range(hrs)]
+    for uid in employee_ids:
+        await database.add_user(uid, f"Співробітник {uid}", "IT", "Спеціаліст", f"load{uid}")
+    for uid in hr_ids:
+        await database.add_user(uid, f"HR {uid}", "HR", "HR-менеджер", f"load{uid}")
+        await database.add_hr(uid)
+    return {
+        "employees": employee_ids,
+        "hrs": hr_ids,
+        "tokens": [await database.generate_hr_token() for _ in range(tokens)],
+    }
+
+
+def summarize(load: Load, session: StubSession, elapsed: float, lag: List[float]) -> Dict[str, Any]:
+    steps = {}
+    for step, samples in sorted(load.latency.items()):
+        steps[step] = {
+            "n": len(samples),
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p95_ms": percentile(samples, 95) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000,
+            "max_ms": max(samples) * 1000,
+        }
+    everything = [s for samples in load.latency.values() for s in samples]
+    return {
+        "elapsed_s": elapsed,
+        "updates": load.updates,
+        "updates_per_sec": load.updates / elapsed if elapsed else 0.0,
+        "flows": dict(load.flows),
+        "errors": dict(load.errors),
+        "handler_latency": {
+            "p50_ms": percentile(everything, 50) * 1000,
+            "p95_ms": percentile(everything, 95) * 1000,
+            "p99_ms": percentile(everything, 99) * 1000,
+        },
+        "steps": steps,
+        "api": {
+            "per_update_mean": sum(load.api_per_update) / len(load.api_per_update) if load.api_per_update else 0.0,
+            "per_update_max": max(load.api_per_update, default=0),
+            "calls": dict(session.calls),
+            "background_calls": dict(session.background),
+            "flood_429": session.flooded,
+            "max_in_flight": session.max_in_flight,
+        },
+        "loop_lag": {
+            "p50_ms": percentile(lag, 50) * 1000,
+            "p99_ms": percentile(lag, 99) * 1000,
+            "max_ms": max(lag, default=0.0) * 1000,
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n{report['updates']} updates in {report['elapsed_s']:.1f}s "
+          f"({report['updates_per_sec']:.1f}/s), flows: {report['flows']}")
+    h = report["handler_latency"]
+    print(f"handler latency: p50 {h['p50_ms']:.1f} ms, p95 {h['p95_ms']:.1f} ms, p99 {h['p99_ms']:.1f} ms")
+    print(f"\n{'step':<24} {'n':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for step, s in report["steps"].items():
+        print(f"{step:<24} {s['n']:>7} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f} {s['max_ms']:>9.1f}")
+    api = report["api"]
+    print(f"\nBot API: {api['per_update_mean']:.2f} calls/update (max {api['per_update_max']}), "
+          f"429s: {api['flood_429']}, max in flight: {api['max_in_flight']}")
+    print(f"  all calls:  {api['calls']}")
+    print(f"  background: {api['background_calls']}")
+    lag = report["loop_lag"]
+    print(f"event loop lag: p50 {lag['p50_ms']:.1f} ms, p99 {lag['p99_ms']:.1f} ms, max {lag['max_ms']:.1f} ms")
+    if report["errors"]:
+        print(f"errors: {report['errors']}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    rnd = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="hr_bot_load_")
+    database.DB_PATH = os.path.join(workdir, database.DB_NAME)
+    database.init_db()
+
+    from bot import create_dispatcher
+
+    seeded = await seed(args.employees, args.hrs, args.tokens)
+    session = StubSession(args.api_latency / 1000, args.api_jitter / 1000, args.flood_ratio, args.retry_after, rnd)
+    bot = Bot(token="1:load", session=session)
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot)
+
+    load = Load(args, dp, bot, session, rnd)
+    load.free_employees = seeded["employees"]
+    load.free_hrs = seeded["hrs"]
+    load.tokens = seeded["tokens"]
+
+    lag: List[float] = []
+    monitor = asyncio.create_task(monitor_loop_lag(lag))
+    print(f"Driving ~{args.rate} updates/s for {args.duration}s "
+          f"({args.employees} employees, {args.hrs} HRs, API latency {args.api_latency} ms)")
+    try:
+        elapsed = await load.drive()
+    finally:
+        monitor.cancel()
+        await dp.emit_shutdown(bot=bot)
+        database.close_db()
+
+    report = summarize(load, session, elapsed, lag)
+    report["config"] = vars(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if not args.keep:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive the real dispatcher with synthetic updates")
+    parser.add_argument("--rate", type=float, default=50, help="target updates per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to generate load for")
+    parser.add_argument("--employees", type=int, default=2000)
+    parser.add_argument("--hrs", type=int, default=10)
+    parser.add_argument("--tokens", type=int, default=2000, help="registration tokens to pre-generate")
+    parser.add_argument("--think", type=float, default=0.3, help="mean pause between a user's steps, seconds")
+    parser.add_argument("--media-ratio", type=float, default=0.3, help="share of requests sent as photo albums")
+    parser.add_argument("--api-latency", type=float, default=50, help="mean Bot API latency, ms")
+    parser.add_argument("--api-jitter", type=float, default=20, help="Bot API latency deviation, ms")
+    parser.add_argument("--flood-ratio", type=float, default=0.0, help="share of API calls answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after sent with simulated 429s")
+    parser.add_argument("--w-register", type=float, default=1)
+    parser.add_argument("--w-request", type=float, default=5)
+    parser.add_argument("--w-user-history", type=float, default=3)
+    parser.add_argument("--w-hr-review", type=float, default=4)
+    parser.add_argument("--w-hr-history", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--keep", action="store_true", help="keep the database")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
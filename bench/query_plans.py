@@ -0,0 +1,165 @@
+"""Query-plan check for database.py.
+
+Runs every database function from bench/database_bench.py once against a
+seeded hr_bot.db with statement tracing on, then runs EXPLAIN QUERY PLAN on
+each distinct statement and flags full scans of the big tables, e.g.
+
+    python bench/query_plans.py --requests 500000 --feedback 100000
+    python bench/query_plans.py --db /tmp/hr_bot_copy.db
+
+--db checks a copy of a real database instead of seeding one; the write
+functions are run too, so never point it at the live file. The exit status
+is 1 when a flagged scan is found.
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+from database_bench import Bench, seed  # noqa: E402
+
+WATCHED_TABLES = ("requests", "anonymous_feedback", "users")
+
+# Transaction control and pragmas have no plan worth checking.
+_SKIP = re.compile(r"^\s*(BEGIN|COMMIT|ROLLBACK|PRAGMA|SAVEPOINT|RELEASE)\b", re.IGNORECASE)
+# "SCAN requests", "SCAN r USING INDEX ..." and the "SCAN TABLE requests"
+# spelling of sqlite before 3.36. Plans name tables by their alias.
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|LEFT\b|INNER\b|ORDER\b|GROUP\b|LIMIT\b|USING\b)(\w+)", re.IGNORECASE)
+
+
+class Statement:
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.functions: Set[str] = set()
+        self.calls = 0
+        self.max_seconds = 0.0
+
+
+def collect(statements: Dict[str, Statement]) -> database.Tracer:
+    def tracer(function: Optional[str], sql: str, seconds: float) -> None:
+        if _SKIP.match(sql):
+            return
+        # Bound values are inlined, so statements that only differ by
+        # them are grouped by the functions that issued them.
+        key = f"{function}\0{' '.join(sql.split())}"
+        statement = statements.get(key)
+        if statement is None:
+            statement = statements[key] = Statement(sql)
+        statement.functions.add(function or "-")
+        statement.calls += 1
+        statement.max_seconds = max(statement.max_seconds, seconds)
+    return tracer
+
+
+def partial_indexes(conn: sqlite3.Connection) -> Set[str]:
+    return {name for table in WATCHED_TABLES for name, in conn.execute(
+        "SELECT name FROM pragma_index_list(?) WHERE partial = 1", (table,)
+    )}
+
+
+def full_scans(conn: sqlite3.Connection, sql: str, partial: Set[str]) -> Tuple[List[str], List[str]]:
+    # A scan of a partial index only visits the rows the query asks for
+    # (e.g. pending requests), so it is listed but not flagged.
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    aliases = dict((alias, table) for table, alias in _ALIAS.findall(sql))
+    flagged = []
+    for line in plan:
+        match = _SCAN.match(line)
+        if match is None:
+            continue
+        name, index = match.groups()
+        if aliases.get(name, name) in WATCHED_TABLES and index not in partial:
+            flagged.append(line)
+    return plan, flagged
+
+
+async def run_cases(bench: Bench) -> None:
+    rows, _ = await database.get_pending_items()
+    bench.pending_requests = [row[1] for row in rows if row[0] == "r"]
+    bench.pending_feedback = [row[1] for row in rows if row[0] == "f"]
+    for name, call, _ in bench.cases():
+        await call()
+
+
+async def main(args: argparse.Namespace) -> int:
+    rnd = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="hr_bot_plans_")
+    database.DB_PATH = os.path.join(workdir, database.DB_NAME)
+    if args.db:
+        shutil.copyfile(args.db, database.DB_PATH)
+        counts = sqlite3.connect(args.db)
+        users = counts.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        requests = counts.execute("SELECT COUNT(*) FROM requests").fetchone()[0]
+        feedback = counts.execute("SELECT COUNT(*) FROM anonymous_feedback").fetchone()[0]
+        counts.close()
+        database.init_db()
+    else:
+        users, requests, feedback = args.users, args.requests, args.feedback
+        database.init_db()
+        database.close_db()
+        started = time.perf_counter()
+        seed(database.DB_PATH, users, args.hrs, requests, feedback, args.pending_ratio, rnd)
+        print(f"Seeded {database.DB_PATH} in {time.perf_counter() - started:.1f}s")
+
+    statements: Dict[str, Statement] = {}
+    database.trace(collect(statements))
+    database.init_db()
+    try:
+        await run_cases(Bench(max(users, 1), args.hrs, max(requests, 1), max(feedback, 1), rnd))
+    finally:
+        database.close_db()
+
+    conn = sqlite3.connect(database.DB_PATH)
+    partial = partial_indexes(conn)
+    flagged_count = 0
+    for statement in sorted(statements.values(), key=lambda s: sorted(s.functions)):
+        plan, flagged = full_scans(conn, statement.sql, partial)
+        flagged_count += bool(flagged)
+        if flagged or args.verbose:
+            marker = "FULL SCAN" if flagged else "ok"
+            print(f"\n[{marker}] {', '.join(sorted(statement.functions))} "
+                  f"({statement.max_seconds * 1000:.3f} ms)")
+            print("    " + " ".join(statement.sql.split())[:400])
+            for line in plan:
+                print(f"      {'!' if line in flagged else ' '} {line}")
+    conn.close()
+
+    print(f"\n{len(statements)} statements checked, {flagged_count} with full scans of "
+          f"{', '.join(WATCHED_TABLES)}")
+
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(database.DB_PATH + suffix)
+        except FileNotFoundError:
+            pass
+    os.rmdir(workdir)
+    return 1 if flagged_count else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check the query plans of database.py for full table scans")
+    parser.add_argument("--db", help="check a copy of this database instead of a seeded one")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--hrs", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500000)
+    parser.add_argument("--feedback", type=int, default=100000)
+    parser.add_argument("--pending-ratio", type=float, default=0.01,
+                        help="share of requests/feedback still waiting for HR")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan, not only flagged ones")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
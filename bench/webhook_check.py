@@ -0,0 +1,126 @@
+"""Local check of the webhook run mode.
+
+Builds the aiohttp app from bot.create_webhook_app against a throwaway
+hr_bot.db and a fake Bot API session, then POSTs a Telegram update to it
+the way Telegram would, e.g.
+
+    python bench/webhook_check.py
+
+The update is sent without the secret token, with a wrong one (both must
+get 401 and reach no handler) and with the right one (200, and the bot
+answers /start with a SendMessage to the sender). Nothing here needs
+network access; the exit status is 1 when a check fails.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime
+from typing import Any, List
+
+# The secret is read from config when bot.py is imported
+if not os.environ.get("WEBHOOK_SECRET"):
+    os.environ["WEBHOOK_SECRET"] = "local-check-secret"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import TelegramMethod  # noqa: E402
+from aiogram.types import Chat, Message, Update, User  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+import database  # noqa: E402
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class FakeSession(BaseSession):
+    # Records Bot API calls instead of sending them.
+
+    def __init__(self):
+        super().__init__()
+        self.calls: List[TelegramMethod] = []
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Any = None) -> Any:
+        self.calls.append(method)
+        if type(method).__name__.startswith("Send"):
+            return Message(
+                message_id=len(self.calls),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private")
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def sample_update(user_id: int) -> str:
+    user = User(id=user_id, is_bot=False, first_name="Webhook", username="webhook_check")
+    return Update(update_id=1, message=Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        from_user=user,
+        text="/start"
+    )).model_dump_json(exclude_none=True)
+
+
+async def main() -> int:
+    import bot as bot_module
+    from config import WEBHOOK_PATH, WEBHOOK_SECRET
+
+    workdir = tempfile.mkdtemp(prefix="hr_bot_webhook_")
+    database.DB_PATH = os.path.join(workdir, database.DB_NAME)
+    database.init_db()
+
+    session = FakeSession()
+    bot = Bot(token="1:local", session=session)
+    dp = bot_module.create_dispatcher(metrics_port=0)
+    client = TestClient(TestServer(bot_module.create_webhook_app(bot, dp)))
+    await client.start_server()
+
+    user_id = 777
+    body = sample_update(user_id)
+    failures = 0
+
+    async def post(label: str, secret: Any, expected: int) -> None:
+        nonlocal failures
+        headers = {"Content-Type": "application/json"}
+        if secret is not None:
+            headers[SECRET_HEADER] = secret
+        before = len(session.calls)
+        response = await client.post(WEBHOOK_PATH, data=body, headers=headers)
+        sent = [m for m in session.calls[before:] if type(m).__name__ == "SendMessage"]
+        ok = response.status == expected and (bool(sent) if expected == 200 else not sent)
+        failures += not ok
+        print(f"{'ok' if ok else 'FAIL':<5} {label:<14} -> {response.status} (expected {expected}), "
+              f"{len(sent)} SendMessage")
+        if expected == 200 and sent and sent[0].chat_id != user_id:
+            failures += 1
+            print(f"FAIL  reply went to {sent[0].chat_id}, not {user_id}")
+
+    try:
+        await post("no secret", None, 401)
+        await post("wrong secret", WEBHOOK_SECRET + "x", 401)
+        await post("right secret", WEBHOOK_SECRET, 200)
+    finally:
+        await client.close()
+        database.close_db()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(database.DB_PATH + suffix)
+            except FileNotFoundError:
+                pass
+        os.rmdir(workdir)
+
+    print("webhook check passed" if not failures else f"{failures} webhook checks failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,26 +1,139 @@
 import asyncio
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from config import BOT_TOKEN
-from database import init_db
+from config import (
+    BOT_TOKEN,
+    RUN_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBAPP_HOST,
+    WEBAPP_PORT,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_CONCURRENCY,
+    WORKERS,
+    METRICS_HOST,
+    METRICS_PORT
+)
+from database import init_db, close_db
 from handlers.register import register_router
 from handlers.user import user_router
 from handlers.hr import hr_router
+from middlewares.metrics import ApiMetricsMiddleware, HandlerMetricsMiddleware, UpdateMetricsMiddleware
+from middlewares.registry import RegistryMiddleware
+from middlewares.username import UsernameMiddleware
+from services.directory import directory
+from services.fsm_storage import SQLiteStorage
+from services.metrics import MetricsServer
+from services.outbox import outbox_worker
+from services.pending_index import pending_index
+from services.registry import registry
+from services.sharding import ShardRouter, WorkerPool
 
 
-async def main():
-    init_db()
-    storage = MemoryStorage()
-    bot = Bot(token=BOT_TOKEN)
+async def instrument_bot(bot: Bot) -> None:
+    bot.session.middleware(ApiMetricsMiddleware())
+
+
+def create_dispatcher(metrics_port: int = METRICS_PORT) -> Dispatcher:
+    storage = SQLiteStorage()
+    metrics_server = MetricsServer(METRICS_HOST, metrics_port)
     dp = Dispatcher(storage=storage)
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    dp.inline_query.middleware(HandlerMetricsMiddleware())
+    dp.update.outer_middleware(UsernameMiddleware())
+    dp.update.outer_middleware(RegistryMiddleware())
+    dp.startup.register(instrument_bot)
+    dp.startup.register(metrics_server.start)
+    dp.startup.register(registry.load)
+    dp.startup.register(directory.load)
+    dp.startup.register(pending_index.load)
+    dp.startup.register(outbox_worker.start)
+    dp.shutdown.register(outbox_worker.stop)
+    dp.shutdown.register(storage.close)
+    dp.shutdown.register(metrics_server.stop)
 
     dp.include_router(register_router)
     dp.include_router(hr_router)
     dp.include_router(user_router)
+    return dp
+
+
+def create_front_dispatcher(pool: WorkerPool, allowed_updates: list) -> Dispatcher:
+    # Receives updates and hands them to worker processes; no handlers here.
+    dp = Dispatcher(allowed_updates=allowed_updates)
+    dp.update.outer_middleware(ShardRouter(pool.queues))
+    return dp
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher, concurrency: int = WEBHOOK_CONCURRENCY) -> web.Application:
+    # Updates are processed inside the request, so the semaphore bounds the
+    # work in flight and Telegram backs off when we are saturated.
+    semaphore = asyncio.Semaphore(concurrency)
+
+    @web.middleware
+    async def limit_concurrency(request: web.Request, handler):
+        async with semaphore:
+            return await handler(request)
+
+    app = web.Application(middlewares=[limit_concurrency])
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=WEBHOOK_SECRET
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
 
-    print("🤖 Бот запущено")
-    await dp.start_polling(bot)
+
+async def set_webhook(bot: Bot, dispatcher: Dispatcher) -> None:
+    await bot.set_webhook(
+        WEBHOOK_URL + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=dispatcher.get("allowed_updates") or dispatcher.resolve_used_update_types()
+    )
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher) -> None:
+    dp.startup.register(set_webhook)
+    runner = web.AppRunner(create_webhook_app(bot, dp))
+    await runner.setup()
+    await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def main():
+    init_db()
+    bot = Bot(token=BOT_TOKEN)
+    dp = create_dispatcher()
+    pool = None
+    if WORKERS > 1:
+        pool = WorkerPool(WORKERS)
+        pool.start()
+        dp = create_front_dispatcher(pool, dp.resolve_used_update_types())
+
+    print(f"🤖 Бот запущено ({RUN_MODE}, воркерів: {WORKERS})")
+    try:
+        if RUN_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await dp.start_polling(
+                bot,
+                allowed_updates=dp.get("allowed_updates") or dp.resolve_used_update_types()
+            )
+    finally:
+        if pool is not None:
+            pool.stop()
+        close_db()
 
 
 if __name__ == "__main__":
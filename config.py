@@ -5,3 +5,54 @@ load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 HR_CHAT_ID = int(os.getenv("HR_CHAT_ID", "0"))
+
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# SQL diagnostics. DB_TRACE_LOG gets every statement, DB_SLOW_QUERY_LOG the ones
+# slower than DB_SLOW_QUERY_MS (0 turns it off). Both contain bound values.
+DB_TRACE_LOG = os.getenv("DB_TRACE_LOG", "")
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "0"))
+DB_SLOW_QUERY_LOG = os.getenv("DB_SLOW_QUERY_LOG", "slow_queries.log")
+
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "8"))
+NOTIFY_GLOBAL_RATE = float(os.getenv("NOTIFY_GLOBAL_RATE", "25"))
+NOTIFY_CHAT_RATE = float(os.getenv("NOTIFY_CHAT_RATE", "1"))
+NOTIFY_CHAT_BURST = float(os.getenv("NOTIFY_CHAT_BURST", "5"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "3"))
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_DRAIN_TIMEOUT = float(os.getenv("OUTBOX_DRAIN_TIMEOUT", "10"))
+
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+
+# "polling" or "webhook"
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "32"))
+
+# More than one worker runs handlers in separate processes, sharded by user
+WORKERS = int(os.getenv("WORKERS", "1"))
+CACHE_POLL_INTERVAL = float(os.getenv("CACHE_POLL_INTERVAL", "2"))
+
+# Categories listed here go first in the HR queue, in this order
+PENDING_CATEGORY_PRIORITY = [c.strip() for c in os.getenv("PENDING_CATEGORY_PRIORITY", "").split(",") if c.strip()]
+
+# Rendered HR history pages kept in memory per process
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "256"))
+
+# Full-text search ranks at most this many of the newest matches per table
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "5000"))
+
+# Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics, 0 turns them off.
+# Sharded workers use METRICS_PORT + 1 + worker index.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
@@ -1,207 +1,759 @@
+import asyncio
+import functools
+import inspect
+import re
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import uuid
-from typing import List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, Optional
 import os
 
+from config import (
+    DB_READERS,
+    DB_BUSY_TIMEOUT_MS,
+    DB_TRACE_LOG,
+    DB_SLOW_QUERY_MS,
+    DB_SLOW_QUERY_LOG,
+    SEARCH_RANK_WINDOW
+)
+from services.metrics import DB_ERRORS, DB_SECONDS
+
 DB_NAME = "hr_bot.db"
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), DB_NAME)
 
+STATEMENT_CACHE_SIZE = 512
 
-def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                telegram_id   INTEGER PRIMARY KEY,
-                full_name     TEXT    NOT NULL,
-                department    TEXT    NOT NULL,
-                position      TEXT    NOT NULL
-            )
-        ''')
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS requests (
-                id               INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id          INTEGER,
-                request_number   INTEGER,
-                category         TEXT,
-                text             TEXT,
-                status           TEXT    DEFAULT 'Відправлено',
-                response         TEXT,
-                assigned_hr_id   INTEGER,
-                created_at       TEXT,
-                updated_at       TEXT,
-                FOREIGN KEY(user_id) REFERENCES users(telegram_id)
-            )
-        ''')
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS anonymous_feedback (
-                id               INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id          INTEGER,
-                text             TEXT    NOT NULL,
-                response         TEXT,
-                assigned_hr_id   INTEGER,
-                created_at       TEXT    NOT NULL,
-                responded_at     TEXT,
-                FOREIGN KEY(user_id) REFERENCES users(telegram_id)
-            )
-        ''')
 
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS hr_tokens (
-                token   TEXT PRIMARY KEY,
-                is_used INTEGER NOT NULL DEFAULT 0
+class _ConnectionPool:
+    # One long-lived writer thread/connection and a few reader threads, each
+    # with its own connection. WAL lets the readers run while a write is open.
+
+    def __init__(self, path: str, readers: int, tracers: Sequence["Tracer"] = ()):
+        self.path = path
+        self.tracers = list(tracers)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.writer = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="hr_bot_db_writer",
+            initializer=self._open,
+            initargs=(False,)
+        )
+        self.readers = ThreadPoolExecutor(
+            max_workers=max(readers, 1),
+            thread_name_prefix="hr_bot_db_reader",
+            initializer=self._open,
+            initargs=(True,)
+        )
+
+    def _open(self, read_only: bool) -> None:
+        conn = sqlite3.connect(
+            self.path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        if read_only:
+            conn.execute("PRAGMA query_only = 1")
+        if self.tracers:
+            self._local.function = None
+            self._local.statement = None
+            conn.set_trace_callback(self._statement)
+        self._local.conn = conn
+        with self._lock:
+            self._connections.append(conn)
+
+    # sqlite only reports when a statement starts, so each one is timed until
+    # the next statement on the same connection or the end of the function,
+    # which includes fetching its rows.
+    def _statement(self, sql: str) -> None:
+        if sql.startswith("--"):
+            # a trigger body, part of the statement that fired it
+            return
+        self._finish_statement()
+        self._local.statement = (sql, time.perf_counter())
+
+    def _finish_statement(self) -> None:
+        statement = self._local.statement
+        if statement is None:
+            return
+        self._local.statement = None
+        sql, started = statement
+        elapsed = time.perf_counter() - started
+        for tracer in self.tracers:
+            tracer(self._local.function, sql, elapsed)
+
+    def read(self, func, *args, **kwargs):
+        if not self.tracers:
+            return func(self._local.conn, *args, **kwargs)
+        self._local.function = func.__name__
+        try:
+            return func(self._local.conn, *args, **kwargs)
+        finally:
+            self._finish_statement()
+            self._local.function = None
+
+    def write(self, func, *args, **kwargs):
+        if not self.tracers:
+            return self._transaction(func, *args, **kwargs)
+        self._local.function = func.__name__
+        try:
+            return self._transaction(func, *args, **kwargs)
+        finally:
+            self._finish_statement()
+            self._local.function = None
+
+    def _transaction(self, func, *args, **kwargs):
+        conn = self._local.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(conn, *args, **kwargs)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def close(self) -> None:
+        self.writer.shutdown(wait=True)
+        self.readers.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+_pool: Optional[_ConnectionPool] = None
+
+# Statement tracers get (database function or None, SQL with bound values,
+# seconds) on the database thread that ran it. Only connections opened by a
+# later init_db() are traced, and tracing costs a callback per statement.
+Tracer = Callable[[Optional[str], str, float], None]
+_tracers: List[Tracer] = []
+_statement_logs: List["_StatementLog"] = []
+
+
+def trace(tracer: Tracer) -> None:
+    _tracers.append(tracer)
+
+
+class _StatementLog:
+    def __init__(self, path: str, threshold: float):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, function: Optional[str], sql: str, seconds: float) -> None:
+        if seconds < self.threshold:
+            return
+        line = (f"{datetime.now().isoformat(timespec='milliseconds')} {seconds * 1000:10.3f} ms "
+                f"{function or '-'}: {' '.join(sql.split())}\n")
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+# Write listeners, keyed by function name. They run on the event loop after
+# the transaction has committed and get (result, arguments by name).
+_listeners: Dict[str, List[Callable[[Any, Dict[str, Any]], None]]] = {}
+
+
+def subscribe(name: str, callback: Callable[[Any, Dict[str, Any]], None]) -> None:
+    _listeners.setdefault(name, []).append(callback)
+
+
+def _timed(kind: str, name: str, started: float, error: Optional[BaseException]) -> None:
+    DB_SECONDS.observe(time.perf_counter() - started, name, kind)
+    if error is not None:
+        DB_ERRORS.inc(name, type(error).__name__)
+
+
+def _reader(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started, error = time.perf_counter(), None
+        try:
+            return await loop.run_in_executor(
+                _pool.readers, functools.partial(_pool.read, func, *args, **kwargs)
             )
-        ''')
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _timed("read", func.__name__, started, error)
+    return wrapper
+
 
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS roles (
-                telegram_id INTEGER PRIMARY KEY,
-                role        TEXT    NOT NULL
+def _writer(func):
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started, error = time.perf_counter(), None
+        try:
+            result = await loop.run_in_executor(
+                _pool.writer, functools.partial(_pool.write, func, *args, **kwargs)
             )
-        ''')
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _timed("write", func.__name__, started, error)
+        listeners = _listeners.get(func.__name__)
+        if listeners:
+            bound = signature.bind(None, *args, **kwargs)
+            bound.apply_defaults()
+            for callback in listeners:
+                callback(result, bound.arguments)
+        return result
+    return wrapper
 
-        conn.commit()
 
+def close_db() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+    for log in _statement_logs:
+        log.close()
+    _statement_logs.clear()
 
-def get_user_role(telegram_id: int) -> Optional[str]:
-    with sqlite3.connect(DB_PATH) as conn:
-        row = conn.execute(
-            "SELECT role FROM roles WHERE telegram_id = ?",
-            (telegram_id,)
-        ).fetchone()
-    return row[0] if row else None
 
+# Schema changes are appended here and never edited once shipped: the
+# position in the list is the migration number stored in PRAGMA user_version.
+MIGRATIONS: List[str] = [
+    # 1: base schema
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        telegram_id   INTEGER PRIMARY KEY,
+        full_name     TEXT    NOT NULL,
+        department    TEXT    NOT NULL,
+        position      TEXT    NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS requests (
+        id               INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id          INTEGER,
+        request_number   INTEGER,
+        category         TEXT,
+        text             TEXT,
+        status           TEXT    DEFAULT 'Відправлено',
+        response         TEXT,
+        assigned_hr_id   INTEGER,
+        created_at       TEXT,
+        updated_at       TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(telegram_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS anonymous_feedback (
+        id               INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id          INTEGER,
+        text             TEXT    NOT NULL,
+        response         TEXT,
+        assigned_hr_id   INTEGER,
+        created_at       TEXT    NOT NULL,
+        responded_at     TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(telegram_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS hr_tokens (
+        token   TEXT PRIMARY KEY,
+        is_used INTEGER NOT NULL DEFAULT 0
+    );
 
-def has_hr_access(telegram_id: int) -> bool:
-    return get_user_role(telegram_id) == "hr"
+    CREATE TABLE IF NOT EXISTS roles (
+        telegram_id INTEGER PRIMARY KEY,
+        role        TEXT    NOT NULL
+    );
+    ''',
+    # 2: indexes for the pending queues, per-user history and HR lookup
+    '''
+    CREATE INDEX IF NOT EXISTS idx_requests_pending
+        ON requests (created_at)
+        WHERE status = 'Відправлено';
+
+    CREATE INDEX IF NOT EXISTS idx_requests_user
+        ON requests (user_id, request_number);
+
+    CREATE INDEX IF NOT EXISTS idx_feedback_unanswered
+        ON anonymous_feedback (created_at)
+        WHERE response IS NULL;
+
+    CREATE INDEX IF NOT EXISTS idx_feedback_user
+        ON anonymous_feedback (user_id, created_at);
 
+    CREATE INDEX IF NOT EXISTS idx_roles_role
+        ON roles (role, telegram_id);
+    ''',
+    # 3: request numbers come from a counter bumped inside the insert transaction
+    '''
+    CREATE TABLE IF NOT EXISTS counters (
+        name   TEXT    PRIMARY KEY,
+        value  INTEGER NOT NULL
+    ) WITHOUT ROWID;
+
+    INSERT OR IGNORE INTO counters (name, value)
+    SELECT 'request_number', COALESCE(MAX(request_number), 0) FROM requests;
+    ''',
+    # 4: processed requests/feedback ordered by their history timestamp
+    '''
+    CREATE INDEX IF NOT EXISTS idx_requests_processed
+        ON requests (COALESCE(updated_at, created_at), id)
+        WHERE status != 'Відправлено';
+
+    CREATE INDEX IF NOT EXISTS idx_feedback_processed
+        ON anonymous_feedback (COALESCE(responded_at, created_at), id)
+        WHERE response IS NOT NULL;
+    ''',
+    # 5: per-employee history ordered by its history timestamp
+    '''
+    CREATE INDEX IF NOT EXISTS idx_requests_user_history
+        ON requests (user_id, COALESCE(updated_at, created_at), id);
+
+    CREATE INDEX IF NOT EXISTS idx_feedback_user_history
+        ON anonymous_feedback (user_id, COALESCE(responded_at, created_at), id);
+    ''',
+    # 6: Telegram @username captured from incoming updates
+    '''
+    ALTER TABLE users ADD COLUMN username TEXT;
+    ''',
+    # 7: optimistic concurrency for request transitions
+    '''
+    ALTER TABLE requests ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+    ''',
+    # 8: notifications written together with the change they announce
+    '''
+    CREATE TABLE IF NOT EXISTS outbox (
+        id            INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id       INTEGER NOT NULL,
+        method        TEXT    NOT NULL,
+        payload       TEXT    NOT NULL,
+        status        TEXT    NOT NULL DEFAULT 'pending',
+        attempts      INTEGER NOT NULL DEFAULT 0,
+        available_at  REAL    NOT NULL,
+        created_at    TEXT    NOT NULL,
+        last_error    TEXT
+    );
 
-def add_hr(telegram_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "INSERT OR REPLACE INTO roles (telegram_id, role) VALUES (?, 'hr')",
-            (telegram_id,)
+    CREATE INDEX IF NOT EXISTS idx_outbox_pending
+        ON outbox (id, available_at)
+        WHERE status = 'pending';
+
+    CREATE INDEX IF NOT EXISTS idx_outbox_chat
+        ON outbox (chat_id, id)
+        WHERE status = 'pending';
+    ''',
+    # 9: aiogram FSM state, so unfinished dialogs survive a restart
+    '''
+    CREATE TABLE IF NOT EXISTS fsm (
+        key    TEXT PRIMARY KEY,
+        state  TEXT,
+        data   TEXT
+    ) WITHOUT ROWID;
+    ''',
+    # 10: generation counter for users/roles, so every process can tell
+    # when its in-memory registry is out of date
+    '''
+    INSERT OR IGNORE INTO counters (name, value) VALUES ('registry', 0);
+
+    CREATE TRIGGER IF NOT EXISTS users_registry_insert AFTER INSERT ON users
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'registry'; END;
+    CREATE TRIGGER IF NOT EXISTS users_registry_update AFTER UPDATE ON users
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'registry'; END;
+    CREATE TRIGGER IF NOT EXISTS users_registry_delete AFTER DELETE ON users
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'registry'; END;
+    CREATE TRIGGER IF NOT EXISTS roles_registry_insert AFTER INSERT ON roles
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'registry'; END;
+    CREATE TRIGGER IF NOT EXISTS roles_registry_update AFTER UPDATE ON roles
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'registry'; END;
+    CREATE TRIGGER IF NOT EXISTS roles_registry_delete AFTER DELETE ON roles
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'registry'; END;
+    ''',
+    # 11: generation counter for the pending queue
+    '''
+    INSERT OR IGNORE INTO counters (name, value) VALUES ('pending', 0);
+
+    CREATE TRIGGER IF NOT EXISTS requests_pending_insert AFTER INSERT ON requests
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'pending'; END;
+    CREATE TRIGGER IF NOT EXISTS requests_pending_update AFTER UPDATE OF status ON requests
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'pending'; END;
+    CREATE TRIGGER IF NOT EXISTS requests_pending_delete AFTER DELETE ON requests
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'pending'; END;
+    CREATE TRIGGER IF NOT EXISTS feedback_pending_insert AFTER INSERT ON anonymous_feedback
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'pending'; END;
+    CREATE TRIGGER IF NOT EXISTS feedback_pending_update AFTER UPDATE OF response ON anonymous_feedback
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'pending'; END;
+    CREATE TRIGGER IF NOT EXISTS feedback_pending_delete AFTER DELETE ON anonymous_feedback
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'pending'; END;
+    ''',
+    # 12: version of everything the history pages show: processed requests
+    # and feedback, and the names of employees and HRs
+    '''
+    INSERT OR IGNORE INTO counters (name, value) VALUES ('history', 0);
+
+    CREATE TRIGGER IF NOT EXISTS requests_history_update AFTER UPDATE ON requests
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'history'; END;
+    CREATE TRIGGER IF NOT EXISTS requests_history_delete AFTER DELETE ON requests
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'history'; END;
+    CREATE TRIGGER IF NOT EXISTS feedback_history_update AFTER UPDATE ON anonymous_feedback
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'history'; END;
+    CREATE TRIGGER IF NOT EXISTS feedback_history_delete AFTER DELETE ON anonymous_feedback
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'history'; END;
+    CREATE TRIGGER IF NOT EXISTS users_history_insert AFTER INSERT ON users
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'history'; END;
+    CREATE TRIGGER IF NOT EXISTS users_history_update AFTER UPDATE ON users
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'history'; END;
+    CREATE TRIGGER IF NOT EXISTS users_history_delete AFTER DELETE ON users
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'history'; END;
+    ''',
+    # 13: full-text search over request and feedback texts and HR responses.
+    # External content tables: the text lives only in requests and
+    # anonymous_feedback, the triggers keep the indexes in step.
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(
+        text, response,
+        content='requests', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5(
+        text, response,
+        content='anonymous_feedback', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    INSERT INTO requests_fts (requests_fts) VALUES ('rebuild');
+    INSERT INTO feedback_fts (feedback_fts) VALUES ('rebuild');
+
+    CREATE TRIGGER IF NOT EXISTS requests_fts_insert AFTER INSERT ON requests BEGIN
+        INSERT INTO requests_fts (rowid, text, response) VALUES (new.id, new.text, new.response);
+    END;
+    CREATE TRIGGER IF NOT EXISTS requests_fts_delete AFTER DELETE ON requests BEGIN
+        INSERT INTO requests_fts (requests_fts, rowid, text, response)
+        VALUES ('delete', old.id, old.text, old.response);
+    END;
+    CREATE TRIGGER IF NOT EXISTS requests_fts_update AFTER UPDATE OF text, response ON requests BEGIN
+        INSERT INTO requests_fts (requests_fts, rowid, text, response)
+        VALUES ('delete', old.id, old.text, old.response);
+        INSERT INTO requests_fts (rowid, text, response) VALUES (new.id, new.text, new.response);
+    END;
+    CREATE TRIGGER IF NOT EXISTS feedback_fts_insert AFTER INSERT ON anonymous_feedback BEGIN
+        INSERT INTO feedback_fts (rowid, text, response) VALUES (new.id, new.text, new.response);
+    END;
+    CREATE TRIGGER IF NOT EXISTS feedback_fts_delete AFTER DELETE ON anonymous_feedback BEGIN
+        INSERT INTO feedback_fts (feedback_fts, rowid, text, response)
+        VALUES ('delete', old.id, old.text, old.response);
+    END;
+    CREATE TRIGGER IF NOT EXISTS feedback_fts_update AFTER UPDATE OF text, response ON anonymous_feedback BEGIN
+        INSERT INTO feedback_fts (feedback_fts, rowid, text, response)
+        VALUES ('delete', old.id, old.text, old.response);
+        INSERT INTO feedback_fts (rowid, text, response) VALUES (new.id, new.text, new.response);
+    END;
+    ''',
+    # 14: deleting an employee takes their requests out of the pending queue
+    '''
+    CREATE TRIGGER IF NOT EXISTS users_pending_delete AFTER DELETE ON users
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'pending'; END;
+    ''',
+]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, script in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        conn.executescript(
+            f"BEGIN IMMEDIATE;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;"
         )
-        conn.commit()
+        print(f"🗄 Міграцію БД №{number} застосовано")
+        version = number
+    return version
 
 
-def get_all_hr_ids() -> List[int]:
-    with sqlite3.connect(DB_PATH) as conn:
-        return [r[0] for r in conn.execute(
-            "SELECT telegram_id FROM roles WHERE role = 'hr'"
-        ).fetchall()]
+def init_db():
+    global _pool
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        migrate(conn)
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+    close_db()
+    if DB_TRACE_LOG:
+        _statement_logs.append(_StatementLog(DB_TRACE_LOG, 0))
+    if DB_SLOW_QUERY_MS > 0:
+        _statement_logs.append(_StatementLog(DB_SLOW_QUERY_LOG, DB_SLOW_QUERY_MS / 1000))
+    _pool = _ConnectionPool(DB_PATH, DB_READERS, _tracers + _statement_logs)
+
+
+# (chat_id, method name, serialized payload) rows for the outbox table
+OutboxMessage = Tuple[int, str, str]
+OutboxBuilder = Callable[[Tuple], Iterable[OutboxMessage]]
+
+
+def _enqueue(conn: sqlite3.Connection, row: Optional[Tuple], outbox: Optional[OutboxBuilder]) -> None:
+    if row is None or outbox is None:
+        return
+    now = datetime.now().isoformat(timespec="seconds")
+    conn.executemany('''
+        INSERT INTO outbox (chat_id, method, payload, available_at, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(chat_id, method, payload, time.time(), now) for chat_id, method, payload in outbox(row)])
+
+
+def _user_role(conn: sqlite3.Connection, telegram_id: int) -> Optional[str]:
+    row = conn.execute(
+        "SELECT role FROM roles WHERE telegram_id = ?",
+        (telegram_id,)
+    ).fetchone()
+    return row[0] if row else None
+
 
+@_reader
+def get_user_role(conn: sqlite3.Connection, telegram_id: int) -> Optional[str]:
+    return _user_role(conn, telegram_id)
 
-def is_token_valid(token: str) -> bool:
-    row = sqlite3.connect(DB_PATH).execute(
+
+@_reader
+def has_hr_access(conn: sqlite3.Connection, telegram_id: int) -> bool:
+    return _user_role(conn, telegram_id) == "hr"
+
+
+@_writer
+def add_hr(conn: sqlite3.Connection, telegram_id: int) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO roles (telegram_id, role) VALUES (?, 'hr')",
+        (telegram_id,)
+    )
+
+
+@_reader
+def get_all_hr_ids(conn: sqlite3.Connection) -> List[int]:
+    return [r[0] for r in conn.execute(
+        "SELECT telegram_id FROM roles WHERE role = 'hr'"
+    ).fetchall()]
+
+
+@_reader
+def is_token_valid(conn: sqlite3.Connection, token: str) -> bool:
+    row = conn.execute(
         "SELECT is_used FROM hr_tokens WHERE token = ?",
         (token,)
     ).fetchone()
     return bool(row and row[0] == 0)
 
 
-def mark_token_as_used(token: str) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "UPDATE hr_tokens SET is_used = 1 WHERE token = ?",
-            (token,)
-        )
-        conn.commit()
+@_writer
+def mark_token_as_used(conn: sqlite3.Connection, token: str) -> None:
+    conn.execute(
+        "UPDATE hr_tokens SET is_used = 1 WHERE token = ?",
+        (token,)
+    )
 
 
-def generate_hr_token() -> str:
+@_writer
+def generate_hr_token(conn: sqlite3.Connection) -> str:
     token = uuid.uuid4().hex[:8]
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("INSERT INTO hr_tokens (token) VALUES (?)", (token,))
-        conn.commit()
+    conn.execute("INSERT INTO hr_tokens (token) VALUES (?)", (token,))
     return token
 
 
-def add_user(telegram_id: int, full_name: str, department: str, position: str) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute('''
-            INSERT OR REPLACE INTO users
-              (telegram_id, full_name, department, position)
-            VALUES (?, ?, ?, ?)
-        ''', (telegram_id, full_name, department, position))
-        conn.commit()
+@_writer
+def add_user(
+    conn: sqlite3.Connection,
+    telegram_id: int,
+    full_name: str,
+    department: str,
+    position: str,
+    username: Optional[str] = None
+) -> None:
+    conn.execute('''
+        INSERT OR REPLACE INTO users
+          (telegram_id, full_name, department, position, username)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (telegram_id, full_name, department, position, username))
 
 
-def get_user(telegram_id: int) -> Optional[Tuple]:
-    return sqlite3.connect(DB_PATH).execute(
+@_writer
+def set_username(conn: sqlite3.Connection, telegram_id: int, username: Optional[str]) -> None:
+    conn.execute(
+        "UPDATE users SET username = ? WHERE telegram_id = ? AND username IS NOT ?",
+        (username, telegram_id, username)
+    )
+
+
+@_reader
+def get_user(conn: sqlite3.Connection, telegram_id: int) -> Optional[Tuple]:
+    return conn.execute(
         "SELECT * FROM users WHERE telegram_id = ?",
         (telegram_id,)
     ).fetchone()
 
 
-def get_all_users() -> List[Tuple[int, str, str, str]]:
-    return sqlite3.connect(DB_PATH).execute(
+@_reader
+def get_users_and_roles(conn: sqlite3.Connection) -> Tuple[List[Tuple], List[Tuple[int, str]], int]:
+    conn.execute("BEGIN")
+    try:
+        users = conn.execute("SELECT * FROM users").fetchall()
+        roles = conn.execute("SELECT telegram_id, role FROM roles").fetchall()
+        generation = conn.execute("SELECT value FROM counters WHERE name = 'registry'").fetchone()
+    finally:
+        conn.execute("COMMIT")
+    return users, roles, generation[0] if generation else 0
+
+
+@_reader
+def get_all_users(conn: sqlite3.Connection) -> List[Tuple[int, str, str, str]]:
+    return conn.execute(
         "SELECT telegram_id, full_name, department, position FROM users"
     ).fetchall()
 
 
-def update_user_info(telegram_id: int, full_name: str, department: str, position: str) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute('''
-            UPDATE users
-            SET full_name = ?, department = ?, position = ?
-            WHERE telegram_id = ?
-        ''', (full_name, department, position, telegram_id))
-        conn.commit()
+@_writer
+def update_user_info(conn: sqlite3.Connection, telegram_id: int, full_name: str, department: str, position: str) -> None:
+    conn.execute('''
+        UPDATE users
+        SET full_name = ?, department = ?, position = ?
+        WHERE telegram_id = ?
+    ''', (full_name, department, position, telegram_id))
+
+
+@_writer
+def delete_user(conn: sqlite3.Connection, telegram_id: int) -> None:
+    conn.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
+    conn.execute("DELETE FROM roles WHERE telegram_id = ?", (telegram_id,))
 
 
-def delete_user(telegram_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
-        conn.execute("DELETE FROM roles WHERE telegram_id = ?", (telegram_id,))
-        conn.commit()
+def _next_request_number(conn: sqlite3.Connection) -> int:
+    return conn.execute('''
+        UPDATE counters
+        SET value = value + 1
+        WHERE name = 'request_number'
+        RETURNING value
+    ''').fetchone()[0]
 
 
-def get_next_request_number() -> int:
-    last = sqlite3.connect(DB_PATH).execute(
-        "SELECT MAX(request_number) FROM requests"
-    ).fetchone()[0]
-    return (last or 0) + 1
+@_reader
+def get_counter(conn: sqlite3.Connection, name: str) -> int:
+    row = conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
 
 
-def add_request(user_id: int, category: str, text: str) -> int:
-    number = get_next_request_number()
+@_writer
+def add_request(
+    conn: sqlite3.Connection,
+    user_id: int,
+    category: str,
+    text: str,
+    outbox: Optional[OutboxBuilder] = None
+) -> Tuple[int, int, int, str, str]:
+    number = _next_request_number(conn)
     now = datetime.now().isoformat(timespec="seconds")
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.execute('''
-            INSERT INTO requests
-              (user_id, request_number, category, text, status, created_at)
-            VALUES (?, ?, ?, ?, 'Відправлено', ?)
-        ''', (user_id, number, category, text, now))
-        conn.commit()
-        return cursor.lastrowid
-
-
-def get_new_requests() -> List[Tuple[int, int, str, str, str, str, str, str]]:
-    with sqlite3.connect(DB_PATH) as conn:
-        return conn.execute('''
-            SELECT
-              r.id,
-              r.request_number,
-              u.full_name,
-              u.department,
-              u.position,
-              r.category,
-              r.text,
-              r.created_at
+    row = conn.execute('''
+        INSERT INTO requests
+          (user_id, request_number, category, text, status, created_at)
+        VALUES (?, ?, ?, ?, 'Відправлено', ?)
+        RETURNING id, request_number, user_id, status, created_at
+    ''', (user_id, number, category, text, now)).fetchone()
+    _enqueue(conn, row, outbox)
+    return row
+
+
+@_reader
+def get_new_requests(conn: sqlite3.Connection) -> List[Tuple]:
+    return conn.execute('''
+        SELECT
+          r.id,
+          r.request_number,
+          u.full_name,
+          u.department,
+          u.position,
+          r.category,
+          r.text,
+          r.created_at,
+          r.user_id,
+          u.username,
+          r.version
+        FROM requests r
+        JOIN users u ON r.user_id = u.telegram_id
+        WHERE r.status = 'Відправлено'
+        ORDER BY r.created_at ASC
+    ''').fetchall()
+
+
+@_reader
+def get_pending_items(conn: sqlite3.Connection) -> Tuple[List[Tuple], int]:
+    # Everything the in-memory pending index needs, plus the 'pending'
+    # generation read in the same snapshot. Requests of deleted employees
+    # are left out, as get_new_requests did.
+    # Rows: (kind, id, number, user_id, category, text, created_at)
+    conn.execute("BEGIN")
+    try:
+        rows = conn.execute('''
+            SELECT 'r', r.id, r.request_number, r.user_id, r.category, r.text, r.created_at
             FROM requests r
-            JOIN users u ON r.user_id = u.telegram_id
+            JOIN users u ON u.telegram_id = r.user_id
             WHERE r.status = 'Відправлено'
-            ORDER BY r.created_at ASC
         ''').fetchall()
+        rows += conn.execute('''
+            SELECT 'f', id, NULL, user_id, NULL, text, created_at
+            FROM anonymous_feedback
+            WHERE response IS NULL
+        ''').fetchall()
+        generation = conn.execute("SELECT value FROM counters WHERE name = 'pending'").fetchone()
+    finally:
+        conn.execute("COMMIT")
+    return rows, generation[0] if generation else 0
+
+
+@_reader
+def get_pending_request(conn: sqlite3.Connection, request_id: int) -> Optional[Tuple]:
+    # Same columns as get_new_requests, or None once the request is processed.
+    return conn.execute('''
+        SELECT
+          r.id,
+          r.request_number,
+          u.full_name,
+          u.department,
+          u.position,
+          r.category,
+          r.text,
+          r.created_at,
+          r.user_id,
+          u.username,
+          r.version
+        FROM requests r
+        JOIN users u ON r.user_id = u.telegram_id
+        WHERE r.id = ? AND r.status = 'Відправлено'
+    ''', (request_id,)).fetchone()
 
 
-def get_user_requests(user_id: int) -> List[Tuple]:
-    return sqlite3.connect(DB_PATH).execute('''
+@_reader
+def get_pending_feedback(conn: sqlite3.Connection, feedback_id: int) -> Optional[Tuple[int, str, str]]:
+    return conn.execute(
+        "SELECT id, text, created_at FROM anonymous_feedback WHERE id = ? AND response IS NULL",
+        (feedback_id,)
+    ).fetchone()
+
+
+@_reader
+def get_user_requests(conn: sqlite3.Connection, user_id: int) -> List[Tuple]:
+    return conn.execute('''
         SELECT
           r.request_number,
           r.category,
@@ -218,77 +770,84 @@ def get_user_requests(user_id: int) -> List[Tuple]:
     ''', (user_id,)).fetchall()
 
 
-def update_request_status(request_id: int, status: Optional[str] = None, response: Optional[str] = None) -> None:
-    now = datetime.now().isoformat(timespec="seconds")
-    with sqlite3.connect(DB_PATH) as conn:
-        if status is not None and response is None:
-            conn.execute('''
-                UPDATE requests
-                SET status = ?, updated_at = ?
-                WHERE id = ?
-            ''', (status, now, request_id))
-        elif response is not None and status is None:
-            conn.execute('''
-                UPDATE requests
-                SET response = ?, updated_at = ?
-                WHERE id = ?
-            ''', (response, now, request_id))
-        elif status is not None and response is not None:
-            conn.execute('''
-                UPDATE requests
-                SET status = ?, response = ?, updated_at = ?
-                WHERE id = ?
-            ''', (status, response, now, request_id))
-        conn.commit()
-
-
-def assign_hr_to_request(request_id: int, hr_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "UPDATE requests SET assigned_hr_id = ? WHERE id = ?",
-            (hr_id, request_id)
-        )
-        conn.commit()
+@_writer
+def update_request_status(
+    conn: sqlite3.Connection,
+    request_id: int,
+    status: Optional[str] = None,
+    response: Optional[str] = None,
+    hr_id: Optional[int] = None,
+    expected_version: Optional[int] = None,
+    outbox: Optional[OutboxBuilder] = None
+) -> Optional[Tuple[int, int, int, str, int]]:
+    # Compare-and-set: only a request that is still waiting (and, when given,
+    # still at expected_version) changes. None means another HR got there first.
+    sets = ["updated_at = ?", "version = version + 1"]
+    params: list = [datetime.now().isoformat(timespec="seconds")]
+    for column, value in (("status", status), ("response", response), ("assigned_hr_id", hr_id)):
+        if value is not None:
+            sets.append(f"{column} = ?")
+            params.append(value)
+    row = conn.execute(f'''
+        UPDATE requests
+        SET {", ".join(sets)}
+        WHERE id = ?
+          AND status = 'Відправлено'
+          AND (? IS NULL OR version = ?)
+        RETURNING id, request_number, user_id, status, version
+    ''', (*params, request_id, expected_version, expected_version)).fetchone()
+    _enqueue(conn, row, outbox)
+    return row
 
 
-def get_request(request_id: int) -> Tuple[int, int]:
-    return sqlite3.connect(DB_PATH).execute(
+@_reader
+def get_request(conn: sqlite3.Connection, request_id: int) -> Tuple[int, int]:
+    return conn.execute(
         "SELECT user_id, request_number FROM requests WHERE id = ?",
         (request_id,)
     ).fetchone()
 
 
-def get_feedback_user(feedback_id: int) -> Optional[int]:
-    row = sqlite3.connect(DB_PATH).execute(
+@_reader
+def get_feedback_user(conn: sqlite3.Connection, feedback_id: int) -> Optional[int]:
+    row = conn.execute(
         "SELECT user_id FROM anonymous_feedback WHERE id = ?",
         (feedback_id,)
     ).fetchone()
     return row[0] if row else None
 
 
-def add_anonymous_feedback(user_id: int, text: str) -> None:
+@_writer
+def add_anonymous_feedback(
+    conn: sqlite3.Connection,
+    user_id: int,
+    text: str,
+    outbox: Optional[OutboxBuilder] = None
+) -> Tuple[int, int, str]:
     now = datetime.now().isoformat(timespec="seconds")
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute('''
-            INSERT INTO anonymous_feedback
-              (user_id, text, created_at)
-            VALUES (?, ?, ?)
-        ''', (user_id, text, now))
-        conn.commit()
-
-
-def get_new_feedback() -> List[Tuple[int, str, str]]:
-    with sqlite3.connect(DB_PATH) as conn:
-        return conn.execute('''
-            SELECT id, text, created_at
-            FROM anonymous_feedback
-            WHERE response IS NULL
-            ORDER BY created_at ASC
-        ''').fetchall()
+    row = conn.execute('''
+        INSERT INTO anonymous_feedback
+          (user_id, text, created_at)
+        VALUES (?, ?, ?)
+        RETURNING id, user_id, created_at
+    ''', (user_id, text, now)).fetchone()
+    _enqueue(conn, row, outbox)
+    return row
+
 
+@_reader
+def get_new_feedback(conn: sqlite3.Connection) -> List[Tuple[int, str, str]]:
+    return conn.execute('''
+        SELECT id, text, created_at
+        FROM anonymous_feedback
+        WHERE response IS NULL
+        ORDER BY created_at ASC
+    ''').fetchall()
 
-def get_user_feedback(user_id: int) -> List[Tuple]:
-    return sqlite3.connect(DB_PATH).execute('''
+
+@_reader
+def get_user_feedback(conn: sqlite3.Connection, user_id: int) -> List[Tuple]:
+    return conn.execute('''
         SELECT
           af.id,
           af.text,
@@ -303,20 +862,27 @@ def get_user_feedback(user_id: int) -> List[Tuple]:
     ''', (user_id,)).fetchall()
 
 
-def add_feedback_response(feedback_id: int, response: str, hr_id: int) -> None:
+@_writer
+def add_feedback_response(
+    conn: sqlite3.Connection,
+    feedback_id: int,
+    response: str,
+    hr_id: int,
+    outbox: Optional[OutboxBuilder] = None
+) -> Optional[Tuple[int, int]]:
     now = datetime.now().isoformat(timespec="seconds")
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute('''
-            UPDATE anonymous_feedback
-            SET response = ?, responded_at = ?, assigned_hr_id = ?
-            WHERE id = ?
-        ''', (response, now, hr_id, feedback_id))
-        conn.commit()
-
-
-def get_processed_requests(limit: Optional[int] = 10) -> List[Tuple]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    row = conn.execute('''
+        UPDATE anonymous_feedback
+        SET response = ?, responded_at = ?, assigned_hr_id = ?
+        WHERE id = ? AND response IS NULL
+        RETURNING id, user_id
+    ''', (response, now, hr_id, feedback_id)).fetchone()
+    _enqueue(conn, row, outbox)
+    return row
+
+
+@_reader
+def get_processed_requests(conn: sqlite3.Connection, limit: Optional[int] = 10) -> List[Tuple]:
     base_sql = '''
         SELECT
           r.id,
@@ -339,17 +905,12 @@ def get_processed_requests(limit: Optional[int] = 10) -> List[Tuple]:
     '''
     if limit is not None:
         base_sql += ' LIMIT ?'
-        cur.execute(base_sql, (limit,))
-    else:
-        cur.execute(base_sql)
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+        return conn.execute(base_sql, (limit,)).fetchall()
+    return conn.execute(base_sql).fetchall()
 
 
-def get_processed_feedbacks(limit: Optional[int] = 10) -> List[Tuple]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+@_reader
+def get_processed_feedbacks(conn: sqlite3.Connection, limit: Optional[int] = 10) -> List[Tuple]:
     base_sql = '''
         SELECT
           af.id,
@@ -367,9 +928,365 @@ def get_processed_feedbacks(limit: Optional[int] = 10) -> List[Tuple]:
     '''
     if limit is not None:
         base_sql += ' LIMIT ?'
-        cur.execute(base_sql, (limit,))
-    else:
-        cur.execute(base_sql)
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+        return conn.execute(base_sql, (limit,)).fetchall()
+    return conn.execute(base_sql).fetchall()
+
+
+# History entries are ordered by (timestamp, kind, id); a cursor is the key of
+# the last entry shown. Requests ('r') sort above feedback ('f') on equal time.
+HISTORY_START: Tuple[str, str, int] = ("9999-12-31T23:59:59", "z", 0)
+_MAX_ID = 2 ** 63 - 1
+
+
+def _seek_id(kind: str, cursor: Tuple[str, str, int]) -> int:
+    _, cursor_kind, cursor_id = cursor
+    if kind == cursor_kind:
+        return cursor_id
+    return _MAX_ID if kind < cursor_kind else 0
+
+
+def _history_seek(newer: bool) -> Tuple[str, str]:
+    # -> (WHERE clause to format with ts= and id=, sort direction)
+    if newer:
+        return "{ts} >= ? AND ({ts} > ? OR {id} > ?)", "ASC"
+    return "{ts} <= ? AND ({ts} < ? OR {id} < ?)", "DESC"
+
+
+def parse_history_cursor(text: str) -> Optional[Tuple[str, str, int]]:
+    # "<ts>_<kind>_<id>" as put into the history pages' callback data
+    try:
+        ts, kind, item_id = text.split("_")
+        return ts, kind, int(item_id)
+    except ValueError:
+        return None
+
+
+@_reader
+def get_hr_history_page(
+    conn: sqlite3.Connection,
+    cursor: Tuple[str, str, int] = HISTORY_START,
+    newer: bool = False,
+    limit: int = 10
+) -> Tuple[List[Tuple], bool]:
+    # Each branch seeks its own index and reads at most limit + 1 rows, so a
+    # page costs the same no matter how long the history is.
+    seek, order = _history_seek(newer)
+    req_ts = "COALESCE(r.updated_at, r.created_at)"
+    fb_ts = "COALESCE(af.responded_at, af.created_at)"
+    sql = f'''
+        SELECT * FROM (
+            SELECT
+              'r' AS kind,
+              r.id,
+              {req_ts} AS ts,
+              r.request_number,
+              u.full_name,
+              u.department,
+              u.position,
+              r.category,
+              r.text,
+              r.status,
+              r.response,
+              r.created_at,
+              r.updated_at,
+              hr.full_name,
+              r.user_id,
+              u.username
+            FROM requests r
+            JOIN users u ON r.user_id = u.telegram_id
+            LEFT JOIN users hr ON r.assigned_hr_id = hr.telegram_id
+            WHERE r.status != 'Відправлено'
+              AND {seek.format(ts=req_ts, id="r.id")}
+            ORDER BY {req_ts} {order}, r.id {order}
+            LIMIT ?
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT
+              'f',
+              af.id,
+              {fb_ts},
+              NULL,
+              NULL,
+              NULL,
+              NULL,
+              NULL,
+              af.text,
+              NULL,
+              af.response,
+              af.created_at,
+              af.responded_at,
+              hr.full_name,
+              NULL,
+              NULL
+            FROM anonymous_feedback af
+            LEFT JOIN users hr ON af.assigned_hr_id = hr.telegram_id
+            WHERE af.response IS NOT NULL
+              AND {seek.format(ts=fb_ts, id="af.id")}
+            ORDER BY {fb_ts} {order}, af.id {order}
+            LIMIT ?
+        )
+        ORDER BY ts {order}, kind {order}, id {order}
+        LIMIT ?
+    '''
+    ts = cursor[0]
+    rows = conn.execute(sql, (
+        ts, ts, _seek_id("r", cursor), limit + 1,
+        ts, ts, _seek_id("f", cursor), limit + 1,
+        limit + 1
+    )).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if newer:
+        rows.reverse()
+    return rows, has_more
+
+
+@_reader
+def get_user_history_page(
+    conn: sqlite3.Connection,
+    user_id: int,
+    cursor: Tuple[str, str, int] = HISTORY_START,
+    newer: bool = False,
+    limit: int = 10
+) -> Tuple[List[Tuple], bool]:
+    # Keyset pages over (ts, kind, id) like get_hr_history_page: each branch
+    # seeks the employee's history index, so a deep page costs the same as
+    # the first one.
+    seek, order = _history_seek(newer)
+    req_ts = "COALESCE(r.updated_at, r.created_at)"
+    fb_ts = "COALESCE(af.responded_at, af.created_at)"
+    sql = f'''
+        SELECT * FROM (
+            SELECT
+              'r' AS kind,
+              r.id,
+              {req_ts} AS ts,
+              r.request_number,
+              r.category,
+              r.text,
+              r.status,
+              r.response,
+              hr.full_name,
+              r.created_at,
+              r.updated_at
+            FROM requests r
+            LEFT JOIN users hr ON r.assigned_hr_id = hr.telegram_id
+            WHERE r.user_id = ?
+              AND {seek.format(ts=req_ts, id="r.id")}
+            ORDER BY {req_ts} {order}, r.id {order}
+            LIMIT ?
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT
+              'f',
+              af.id,
+              {fb_ts},
+              NULL,
+              NULL,
+              af.text,
+              NULL,
+              af.response,
+              hr.full_name,
+              af.created_at,
+              af.responded_at
+            FROM anonymous_feedback af
+            LEFT JOIN users hr ON af.assigned_hr_id = hr.telegram_id
+            WHERE af.user_id = ?
+              AND {seek.format(ts=fb_ts, id="af.id")}
+            ORDER BY {fb_ts} {order}, af.id {order}
+            LIMIT ?
+        )
+        ORDER BY ts {order}, kind {order}, id {order}
+        LIMIT ?
+    '''
+    ts = cursor[0]
+    rows = conn.execute(sql, (
+        user_id, ts, ts, _seek_id("r", cursor), limit + 1,
+        user_id, ts, ts, _seek_id("f", cursor), limit + 1,
+        limit + 1
+    )).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if newer:
+        rows.reverse()
+    return rows, has_more
+
+
+_SEARCH_WORD = re.compile(r"\w+")
+
+
+def _fts_query(text: str) -> Optional[str]:
+    # Every word is quoted and matched as a prefix, so user input can never
+    # be read as FTS5 query syntax.
+    words = _SEARCH_WORD.findall(text)
+    return " ".join(f'"{word}"*' for word in words) if words else None
+
+
+@_reader
+def search_items(
+    conn: sqlite3.Connection,
+    query: str,
+    kind: Optional[str] = None,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 10,
+    rank_window: int = SEARCH_RANK_WINDOW
+) -> Tuple[List[Tuple], int, int]:
+    # -> (rows, ranked, matches). Rows: (kind, id, request_number, category,
+    # status, created_at, text, response), best match first. Feedback has no
+    # category and its status is 'Відправлено' until HR answers, so a
+    # category or a request status filter leaves only requests.
+    match = _fts_query(query)
+    if match is None:
+        return [], 0, 0
+    sources, params = [], []
+    if kind in (None, "r"):
+        # The join is only paid for when a filter needs the requests row
+        source, args = "requests_fts WHERE requests_fts MATCH ?", [match]
+        if category is not None or status is not None:
+            source = "requests_fts JOIN requests r ON r.id = requests_fts.rowid WHERE requests_fts MATCH ?"
+            if category is not None:
+                source += " AND r.category = ?"
+                args.append(category)
+            if status is not None:
+                source += " AND r.status = ?"
+                args.append(status)
+        sources.append(("r", "requests_fts", source))
+        params += args
+    if kind in (None, "f") and category is None and status in (None, "Відправлено"):
+        source = "feedback_fts WHERE feedback_fts MATCH ?"
+        if status is not None:
+            source = ("feedback_fts JOIN anonymous_feedback af ON af.id = feedback_fts.rowid "
+                      "WHERE feedback_fts MATCH ? AND af.response IS NULL")
+        sources.append(("f", "feedback_fts", source))
+        params.append(match)
+    branches = [f'''
+        SELECT * FROM (
+            SELECT '{item_kind}' AS kind, {fts}.rowid AS id, bm25({fts}) AS rank
+            FROM {source}
+            ORDER BY {fts}.rowid DESC
+            LIMIT {int(rank_window)}
+        )
+    ''' for item_kind, fts, source in sources]
+    counts = [f"SELECT COUNT(*) FROM {source}" for _, _, source in sources]
+    if not branches:
+        return [], 0, 0
+
+    # bm25() is what a query matching most of the table spends its time on,
+    # so only the newest rank_window matches of each table are ranked and
+    # paged; ranked counts those, matches is exact. The page itself is read
+    # by primary key: asking FTS5 for snippet() of a few rowids re-runs the
+    # whole MATCH per rowid.
+    conn.execute("BEGIN")
+    try:
+        per_source = conn.execute(f"SELECT {', '.join(f'({c})' for c in counts)}", params).fetchone()
+        matches = sum(per_source)
+        ranked = sum(min(count, int(rank_window)) for count in per_source)
+        page = conn.execute(f'''
+            SELECT kind, id
+            FROM ({' UNION ALL '.join(branches)})
+            ORDER BY rank, id DESC
+            LIMIT ? OFFSET ?
+        ''', (*params, limit, offset)).fetchall()
+        found: Dict[Tuple[str, int], Tuple] = {}
+        request_ids = [item_id for item_kind, item_id in page if item_kind == "r"]
+        if request_ids:
+            for row in conn.execute(f'''
+                SELECT 'r', id, request_number, category, status, created_at, text, response
+                FROM requests
+                WHERE id IN ({",".join("?" * len(request_ids))})
+            ''', request_ids):
+                found[("r", row[1])] = row
+        feedback_ids = [item_id for item_kind, item_id in page if item_kind == "f"]
+        if feedback_ids:
+            for row in conn.execute(f'''
+                SELECT 'f', id, NULL, NULL,
+                       CASE WHEN response IS NULL THEN 'Відправлено' ELSE 'Відповідь' END,
+                       created_at, text, response
+                FROM anonymous_feedback
+                WHERE id IN ({",".join("?" * len(feedback_ids))})
+            ''', feedback_ids):
+                found[("f", row[1])] = row
+    finally:
+        conn.execute("COMMIT")
+    return [found[ref] for ref in page if ref in found], ranked, matches
+
+
+@_reader
+def get_fsm_record(conn: sqlite3.Connection, key: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    return conn.execute("SELECT state, data FROM fsm WHERE key = ?", (key,)).fetchone()
+
+
+@_writer
+def save_fsm_records(conn: sqlite3.Connection, records: List[Tuple[str, Optional[str], Optional[str]]]) -> None:
+    # A key with neither state nor data is removed instead of stored.
+    conn.executemany('''
+        INSERT INTO fsm (key, state, data) VALUES (?, ?, ?)
+        ON CONFLICT (key) DO UPDATE SET state = excluded.state, data = excluded.data
+    ''', [r for r in records if r[1] is not None or r[2] is not None])
+    conn.executemany(
+        "DELETE FROM fsm WHERE key = ?",
+        [(r[0],) for r in records if r[1] is None and r[2] is None]
+    )
+
+
+@_writer
+def claim_outbox(conn: sqlite3.Connection, limit: int, lease: float) -> List[Tuple[int, int, str, str, int]]:
+    # Leases the oldest due messages. A chat is skipped while an earlier
+    # message of its own is leased or waiting for a retry, which keeps
+    # per-chat order even with several workers draining the table.
+    now = time.time()
+    rows = conn.execute('''
+        UPDATE outbox
+        SET available_at = ?, attempts = attempts + 1
+        WHERE id IN (
+            SELECT o.id
+            FROM outbox o
+            WHERE o.status = 'pending'
+              AND o.available_at <= ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM outbox e
+                  WHERE e.chat_id = o.chat_id
+                    AND e.status = 'pending'
+                    AND e.id < o.id
+                    AND e.available_at > ?
+              )
+            ORDER BY o.id
+            LIMIT ?
+        )
+        RETURNING id, chat_id, method, payload, attempts
+    ''', (now + lease, now, now, limit)).fetchall()
+    return sorted(rows)
+
+
+@_writer
+def ack_outbox(conn: sqlite3.Connection, entry_ids: List[int]) -> None:
+    conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in entry_ids])
+
+
+@_writer
+def retry_outbox(conn: sqlite3.Connection, entry_ids: List[int], delay: float, error: Optional[str] = None) -> None:
+    conn.executemany(
+        "UPDATE outbox SET available_at = ?, last_error = COALESCE(?, last_error) WHERE id = ?",
+        [(time.time() + delay, error, i) for i in entry_ids]
+    )
+
+
+@_writer
+def release_outbox(conn: sqlite3.Connection, entry_ids: List[int]) -> None:
+    # Hands back leased messages that were never attempted.
+    conn.executemany(
+        "UPDATE outbox SET available_at = ?, attempts = attempts - 1 WHERE id = ?",
+        [(time.time(), i) for i in entry_ids]
+    )
+
+
+@_writer
+def fail_outbox(conn: sqlite3.Connection, entry_ids: List[int], error: str) -> None:
+    conn.executemany(
+        "UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ?",
+        [(error, i) for i in entry_ids]
+    )
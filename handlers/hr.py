@@ -3,95 +3,198 @@ from aiogram.types import (
     Message,
     CallbackQuery,
     InlineKeyboardMarkup,
-    InlineKeyboardButton
+    InlineKeyboardButton,
+    InlineQuery,
+    InlineQueryResultArticle,
+    InputTextMessageContent
 )
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
+from aiogram.methods import SendMessage
 
-from datetime import datetime
-from states import HRState, EditUserState
+import html
+from typing import Optional, Tuple
+
+from states import HRState, EditUserState, DirectoryState, SearchState
+from keyboards.user_keyboards import REQUEST_CATEGORIES
 from keyboards.hr_keyboards import (
     get_hr_main_menu,
     get_settings_keyboard,
     get_request_action_keyboard,
+    get_pending_queue_keyboard,
     get_feedback_action_keyboard,
     get_user_list_keyboard,
+    get_employee_keyboard,
+    get_department_keyboard,
     get_confirm_delete_keyboard,
-    get_assign_hr_keyboard
+    get_assign_hr_keyboard,
+    get_search_keyboard
 )
 from database import (
-    has_hr_access,
-    get_new_requests,
-    get_new_feedback,
-    get_processed_requests,
-    get_processed_feedbacks,
-    assign_hr_to_request,
+    get_pending_request,
+    get_pending_feedback,
+    get_hr_history_page,
+    HISTORY_START,
+    parse_history_cursor,
     update_request_status,
-    get_request,
-    get_user,
-    get_all_users,
     delete_user,
     update_user_info,
     generate_hr_token,
     add_feedback_response,
     add_hr,
-    get_feedback_user
+    search_items
 )
-
-hr_router = Router()
+from services.chat_cache import get_username
+from services.directory import department_key, directory
+from services.outbox import enqueue, outbox_worker
+from services.page_cache import hr_history_cache
+from services.pending_index import pending_index
+from services.search import snippet
+from services.registry import Registry
+
+hr_router = Router(name="hr_router")
 PAGE_SIZE = 10
+INLINE_PAGE_SIZE = 50
+# Departments are typed at registration, so there can be any number of
+# them: the directory shows the biggest few and pages the rest.
+TOP_DEPARTMENTS = 6
+ALREADY_HANDLED = "⚠️ Заявку вже опрацьовано або змінено іншим HR."
 
 
-async def check_hr_rights(message: Message) -> bool:
-    if not has_hr_access(message.from_user.id):
+async def check_hr_rights(message: Message, registry: Registry) -> bool:
+    if not registry.is_hr(message.from_user.id):
         await message.answer("🚫 У вас немає прав HR.")
         return False
     return True
 
 
+async def check_hr_callback(callback: CallbackQuery, registry: Registry) -> bool:
+    # Inline search results can be posted to any chat, so their buttons
+    # (and the request cards they open) may be pressed by non-HR users.
+    if not registry.is_hr(callback.from_user.id):
+        await callback.answer("🚫 У вас немає прав HR.", show_alert=True)
+        return False
+    return True
+
+
 @hr_router.message(F.text == "/hr")
-async def hr_start(message: Message):
-    if await check_hr_rights(message):
+async def hr_start(message: Message, registry: Registry):
+    if await check_hr_rights(message, registry):
         await message.answer("📋 Панель HR:", reply_markup=get_hr_main_menu())
 
 
+def _snippet(text: Optional[str], limit: int = 60) -> str:
+    text = " ".join((text or "").split())
+    if len(text) > limit:
+        text = text[:limit - 1] + "…"
+    return html.escape(text)
+
+
+async def _render_pending(registry: Registry, offset: int = 0):
+    total = pending_index.count()
+    if offset >= total:
+        offset = max((total - 1) // PAGE_SIZE * PAGE_SIZE, 0)
+    rows = pending_index.page(offset, PAGE_SIZE)
+    if not rows:
+        return "✅ Немає нових заявок чи відгуків.", None
+
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    lines = [f"📥 <b>Нові заявки та відгуки: {total}</b> (стор. {offset // PAGE_SIZE + 1}/{pages})"]
+    for kind, item_id, num, user_id, cat, txt, created in rows:
+        if kind == "r":
+            user = registry.user(user_id)
+            full = user[1] if user else "—"
+            lines.append(f"🆕 <b>№{num}</b> · {html.escape(full)} · {html.escape(cat)}\n    {_snippet(txt)}")
+        else:
+            lines.append(f"✉️ <b>Відгук №{item_id}</b>\n    {_snippet(txt)}")
+    text = "\n\n".join(lines)
+    return text, get_pending_queue_keyboard(rows, offset, total, PAGE_SIZE)
+
+
 @hr_router.message(F.text == "📥 Нові заявки")
-async def new_requests(message: Message):
-    if not await check_hr_rights(message):
+async def new_requests(message: Message, registry: Registry):
+    if not await check_hr_rights(message, registry):
         return
+    text, kb = await _render_pending(registry)
+    await message.answer(text, parse_mode="HTML", reply_markup=kb)
 
-    reqs = get_new_requests()
-    fbs = get_new_feedback()
-    if not reqs and not fbs:
-        await message.answer("✅ Немає нових заявок чи відгуків.")
-        return
 
-    for req_id, num, full, dept, pos, cat, txt, created in reqs:
-        user_id, _ = get_request(req_id)
-        chat = await message.bot.get_chat(user_id)
-        username = chat.username or "—"
-        await message.answer(
+@hr_router.callback_query(F.data.startswith("pending_page_"))
+async def pending_page(callback: CallbackQuery, registry: Registry):
+    await callback.answer()
+    text, kb = await _render_pending(registry, int(callback.data.split("_")[-1]))
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+
+
+async def _send_pending_item(callback: CallbackQuery, kind: str, item_id: int) -> bool:
+    if kind == "r":
+        row = await get_pending_request(item_id)
+        if row is None:
+            return False
+        req_id, num, full, dept, pos, cat, txt, created, user_id, username, version = row
+        username = username or await get_username(callback.bot, user_id) or "—"
+        text = (
             f"🆕 <b>Заявка №{num}</b>\n"
             f"👤 {full} (@{username})\n"
             f"🏢 {dept} | 💼 {pos}\n"
             f"📂 {cat}\n"
-            f"📝 {txt}",
-            parse_mode="HTML",
-            reply_markup=get_request_action_keyboard(req_id)
+            f"📝 {txt}"
         )
+        kb = get_request_action_keyboard(req_id, version)
+    else:
+        row = await get_pending_feedback(item_id)
+        if row is None:
+            return False
+        fid, txt, created = row
+        text = f"✉️ <b>Анонімний відгук №{fid}</b>\n{txt}"
+        kb = get_feedback_action_keyboard(fid)
+
+    if pending_index.count() > 1:
+        kb.inline_keyboard.append([
+            InlineKeyboardButton(text="⏭ Наступна", callback_data=f"pending_next_{kind}_{item_id}")
+        ])
+    # not callback.message: inline search results have no bot message
+    await callback.bot.send_message(callback.from_user.id, text, parse_mode="HTML", reply_markup=kb)
+    return True
 
-    for fid, text, created in fbs:
-        await message.answer(
-            f"✉️ <b>Анонімний відгук №{fid}</b>\n{text}",
-            parse_mode="HTML",
-            reply_markup=get_feedback_action_keyboard(fid)
-        )
+
+@hr_router.callback_query(F.data.startswith("pending_open_"))
+async def pending_open(callback: CallbackQuery, registry: Registry):
+    if not await check_hr_callback(callback, registry):
+        return
+    _, _, kind, item_id = callback.data.split("_")
+    if not await _send_pending_item(callback, kind, int(item_id)):
+        await callback.answer(ALREADY_HANDLED, show_alert=True)
+        return
+    await callback.answer()
+
+
+@hr_router.callback_query(F.data.startswith("pending_next_"))
+async def pending_next(callback: CallbackQuery, registry: Registry):
+    if not await check_hr_callback(callback, registry):
+        return
+    _, _, kind, item_id = callback.data.split("_")
+    row = pending_index.next_after(kind, int(item_id))
+    if row is None or not await _send_pending_item(callback, row[0], row[1]):
+        await callback.answer("✅ Немає нових заявок чи відгуків.", show_alert=True)
+        return
+    await callback.answer()
+
+
+def _parse_request_action(data: str) -> Tuple[int, Optional[int]]:
+    # approve_<id>_<version>; buttons sent before versioning carry no version
+    parts = data.split("_")[1:]
+    version = int(parts[1]) if len(parts) > 1 else None
+    return int(parts[0]), version
 
 
 @hr_router.callback_query(F.data.startswith("comment_"))
-async def comment_request(callback: CallbackQuery, state: FSMContext):
+async def comment_request(callback: CallbackQuery, state: FSMContext, registry: Registry):
+    if not await check_hr_callback(callback, registry):
+        return
     await callback.answer()
-    rid = int(callback.data.split("_")[1])
-    await state.update_data(request_id=rid)
+    rid, version = _parse_request_action(callback.data)
+    await state.update_data(request_id=rid, request_version=version)
     await state.set_state(HRState.add_comment)
     await callback.message.answer(f"✏️ Введіть коментар до заявки №{rid}:")
 
@@ -115,26 +218,38 @@ async def comment_preview(message: Message, state: FSMContext):
 
 
 @hr_router.callback_query(F.data == "save_comment")
-async def save_comment(callback: CallbackQuery, state: FSMContext):
-    await callback.answer()
+async def save_comment(callback: CallbackQuery, state: FSMContext, registry: Registry):
+    if not await check_hr_callback(callback, registry):
+        return
     data = await state.get_data()
     rid = data["request_id"]
     comment = data["comment"]
 
-    assign_hr_to_request(rid, callback.from_user.id)
-    update_request_status(rid, None, comment)
-
-    user_id, _ = get_request(rid)
-    await callback.bot.send_message(
-        user_id,
-        f"💬 HR додав коментар до вашої заявки №{rid}:\n{comment}"
+    row = await update_request_status(
+        rid,
+        response=comment,
+        hr_id=callback.from_user.id,
+        expected_version=data.get("request_version"),
+        outbox=enqueue(lambda r: [SendMessage(
+            chat_id=r[2],
+            text=f"💬 HR додав коментар до вашої заявки №{r[1]}:\n{comment}"
+        )])
     )
+    if row is None:
+        await callback.answer(ALREADY_HANDLED, show_alert=True)
+        await callback.message.delete()
+        await state.clear()
+        return
+
+    outbox_worker.wake()
+    await callback.answer()
+    _, num, _, _, version = row
 
     await callback.message.delete()
     await callback.bot.send_message(
         callback.from_user.id,
-        f"✅ Коментар збережено. Тепер схваліть або відхиліть заявку №{rid}.",
-        reply_markup=get_hr_main_menu()
+        f"✅ Коментар збережено. Тепер схваліть або відхиліть заявку №{num}.",
+        reply_markup=get_request_action_keyboard(rid, version)
     )
     await state.clear()
 
@@ -159,36 +274,23 @@ async def cancel_comment(callback: CallbackQuery, state: FSMContext):
     await state.clear()
 
 
-async def _render_hr_history(bot, offset: int):
-    raw_reqs = get_processed_requests(limit=None)
-    raw_fbs = get_processed_feedbacks(limit=None)
+async def _render_hr_history(bot, cursor: Tuple[str, str, int] = HISTORY_START, newer: bool = False):
+    return await hr_history_cache.get(
+        (cursor, newer),
+        lambda: _build_hr_history(bot, cursor, newer)
+    )
 
-    items = []
-    for r in raw_reqs:
-        ts_str = r[10] or r[9]
-        ts = datetime.fromisoformat(ts_str)
-        items.append(("req", r, ts))
-    for f in raw_fbs:
-        ts_str = f[4] or f[3]
-        ts = datetime.fromisoformat(ts_str)
-        items.append(("fb", f, ts))
-    items.sort(key=lambda x: x[2], reverse=True)
 
-    page = items[offset : offset + PAGE_SIZE]
-    if not page:
+async def _build_hr_history(bot, cursor: Tuple[str, str, int], newer: bool):
+    rows, has_more = await get_hr_history_page(cursor, newer, PAGE_SIZE)
+    if not rows:
         return "📭 Немає оброблених записів на цій сторінці.", None
 
     parts = []
-    for kind, fields, _ in page:
-        if kind == "req":
-            (_id, num, full, dept, pos, cat, txt,
-             status, resp, created, updated, hr_name) = fields
-            try:
-                user_id, _ = get_request(_id)
-                chat = await bot.get_chat(user_id)
-                username = chat.username or "—"
-            except Exception:
-                username = "-"
+    for (kind, _id, _ts, num, full, dept, pos, cat, txt,
+         status, resp, created, processed, hr_name, user_id, username) in rows:
+        if kind == "r":
+            username = username or await get_username(bot, user_id) or "—"
             symbol = "✅" if status == "Схвалено" else "❌" if status == "Відхилено" else ""
             parts.append(
                 f"📌 <b>Заявка №{num}</b>\n"
@@ -199,38 +301,40 @@ async def _render_hr_history(bot, offset: int):
                 f"📂 Категорія: {cat}\n"
                 f"📝 Текст звернення: {txt}\n"
                 f"📅 Створено: {created}\n"
-                f"🕒 Опрацьовано: {updated or '⏱️'}\n"
+                f"🕒 Опрацьовано: {processed or '⏱️'}\n"
                 f"👥 HR: {hr_name or '⏳'}\n"
                 f"💬 Коментар: {resp or '—'}\n"
                 #f"📊 Результат: {symbol}{status}"
             )
         else:
-            fid, user_name, fb_text, fb_response, created_fb, responded_at, fb_hr = fields
             parts.append(
-                f"🥷 <b>Анонімний відгук №{fid}</b>\n"
-                f"📝 {fb_text}\n"
-                f"📅 Створено: {created_fb}\n"
-                f"🕒 Опрацьовано: {responded_at or '⏱️'}\n"
-                f"👥 HR: {fb_hr or '⏳'}\n"
-                f"💬 Відповідь HR: {fb_response or 'Відсутня'}"
+                f"🥷 <b>Анонімний відгук №{_id}</b>\n"
+                f"📝 {txt}\n"
+                f"📅 Створено: {created}\n"
+                f"🕒 Опрацьовано: {processed or '⏱️'}\n"
+                f"👥 HR: {hr_name or '⏳'}\n"
+                f"💬 Відповідь HR: {resp or 'Відсутня'}"
             )
 
     text = "\n\n".join(parts) if parts else "-"
-    total = len(items)
+
+    has_newer = has_more if newer else cursor != HISTORY_START
+    has_older = True if newer else has_more
+    first, last = rows[0], rows[-1]
 
     buttons = []
-    if offset >= PAGE_SIZE:
+    if has_newer:
         buttons.append(
             InlineKeyboardButton(
                 text="⬅️ Попередні",
-                callback_data=f"hr_history_prev_{offset - PAGE_SIZE}"
+                callback_data=f"hr_history_prev_{first[2]}_{first[0]}_{first[1]}"
             )
         )
-    if offset + PAGE_SIZE < total:
+    if has_older:
         buttons.append(
             InlineKeyboardButton(
                 text="Наступні ➡️",
-                callback_data=f"hr_history_next_{offset + PAGE_SIZE}"
+                callback_data=f"hr_history_next_{last[2]}_{last[0]}_{last[1]}"
             )
         )
 
@@ -239,71 +343,90 @@ async def _render_hr_history(bot, offset: int):
 
 
 @hr_router.message(F.text == "📜 Історія заявок")
-async def hr_history(message: Message):
-    if not await check_hr_rights(message):
+async def hr_history(message: Message, registry: Registry):
+    if not await check_hr_rights(message, registry):
         return
-    text, kb = await _render_hr_history(message.bot, 0)
+    text, kb = await _render_hr_history(message.bot)
     await message.answer(text, parse_mode="HTML", reply_markup=kb)
 
 
 @hr_router.callback_query(F.data.startswith("hr_history_next_"))
 async def hr_history_next(cb: CallbackQuery):
     await cb.answer()
-    offset = int(cb.data.split("_")[-1])
-    text, kb = await _render_hr_history(cb.bot, offset)
+    cursor = parse_history_cursor(cb.data[len("hr_history_next_"):]) or HISTORY_START
+    text, kb = await _render_hr_history(cb.bot, cursor)
     await cb.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
 
 
 @hr_router.callback_query(F.data.startswith("hr_history_prev_"))
 async def hr_history_prev(cb: CallbackQuery):
     await cb.answer()
-    offset = int(cb.data.split("_")[-1])
-    text, kb = await _render_hr_history(cb.bot, offset)
+    cursor = parse_history_cursor(cb.data[len("hr_history_prev_"):])
+    if cursor is None:
+        text, kb = await _render_hr_history(cb.bot)
+    else:
+        text, kb = await _render_hr_history(cb.bot, cursor, newer=True)
     await cb.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
 
 
 @hr_router.callback_query(F.data.startswith("approve_"))
-async def approve_request(callback: CallbackQuery):
-    await callback.answer()
-    req_id = int(callback.data.split("_")[-1])
-    assign_hr_to_request(req_id, callback.from_user.id)
-    update_request_status(req_id, "✅ Схвалено", None)
-    user_id, _ = get_request(req_id)
+async def approve_request(callback: CallbackQuery, registry: Registry):
+    if not await check_hr_callback(callback, registry):
+        return
+    req_id, version = _parse_request_action(callback.data)
+    row = await update_request_status(
+        req_id,
+        "✅ Схвалено",
+        hr_id=callback.from_user.id,
+        expected_version=version,
+        outbox=enqueue(lambda r: [SendMessage(chat_id=r[2], text=f"✅ Ваша заявка №{r[1]} схвалена.")])
+    )
+    if row is None:
+        await callback.answer(ALREADY_HANDLED, show_alert=True)
+        return
 
+    outbox_worker.wake()
+    await callback.answer()
+    num = row[1]
     await callback.message.delete()
-    await callback.bot.send_message(
-        user_id,
-        f"✅ Ваша заявка №{req_id} схвалена."
-    )
     await callback.bot.send_message(
         callback.from_user.id,
-        f"✅ Заявку №{req_id} опрацьовано та схвалено.",
+        f"✅ Заявку №{num} опрацьовано та схвалено.",
         reply_markup=get_hr_main_menu()
     )
 
 
 @hr_router.callback_query(F.data.startswith("reject_"))
-async def reject_request(callback: CallbackQuery):
-    await callback.answer()
-    req_id = int(callback.data.split("_")[-1])
-    assign_hr_to_request(req_id, callback.from_user.id)
-    update_request_status(req_id, "❌ Відхилено", None)
-    user_id, _ = get_request(req_id)
+async def reject_request(callback: CallbackQuery, registry: Registry):
+    if not await check_hr_callback(callback, registry):
+        return
+    req_id, version = _parse_request_action(callback.data)
+    row = await update_request_status(
+        req_id,
+        "❌ Відхилено",
+        hr_id=callback.from_user.id,
+        expected_version=version,
+        outbox=enqueue(lambda r: [SendMessage(chat_id=r[2], text=f"❌ Ваша заявка №{r[1]} відхилена.")])
+    )
+    if row is None:
+        await callback.answer(ALREADY_HANDLED, show_alert=True)
+        return
 
+    outbox_worker.wake()
+    await callback.answer()
+    num = row[1]
     await callback.message.delete()
-    await callback.bot.send_message(
-        user_id,
-        f"❌ Ваша заявка №{req_id} відхилена."
-    )
     await callback.bot.send_message(
         callback.from_user.id,
-        f"❌ Заявку №{req_id} опрацьовано та відхилено.",
+        f"❌ Заявку №{num} опрацьовано та відхилено.",
         reply_markup=get_hr_main_menu()
     )
 
 
 @hr_router.callback_query(F.data.startswith("reply_feedback_"))
-async def ask_feedback_reply(callback: CallbackQuery, state: FSMContext):
+async def ask_feedback_reply(callback: CallbackQuery, state: FSMContext, registry: Registry):
+    if not await check_hr_callback(callback, registry):
+        return
     await callback.answer()
     fid = int(callback.data.split("_")[-1])
     await state.update_data(
@@ -333,22 +456,33 @@ async def feedback_reply_entered(message: Message, state: FSMContext):
 
 
 @hr_router.callback_query(F.data == "send_feedback_reply")
-async def send_feedback_reply(callback: CallbackQuery, state: FSMContext):
-    await callback.answer()
+async def send_feedback_reply(callback: CallbackQuery, state: FSMContext, registry: Registry):
+    if not await check_hr_callback(callback, registry):
+        return
     data = await state.get_data()
     fid = data["feedback_id"]
     resp = data["response"]
-    add_feedback_response(fid, resp, callback.from_user.id)
-    user_id = get_feedback_user(fid)
+    row = await add_feedback_response(
+        fid,
+        resp,
+        callback.from_user.id,
+        outbox=enqueue(lambda r: [SendMessage(
+            chat_id=r[1],
+            text=f"📣 У вашому відгуку №{fid} відповідь:\n{resp}"
+        )] if r[1] else [])
+    )
+    if row is None:
+        await callback.answer("⚠️ На цей відгук вже відповів інший HR.", show_alert=True)
+        await callback.message.delete()
+        await state.clear()
+        return
+
+    outbox_worker.wake()
+    await callback.answer()
 
     await callback.bot.delete_message(data["fb_chat_id"], data["fb_msg_id"])
     await callback.message.delete()
 
-    if user_id:
-        await callback.bot.send_message(
-            user_id,
-            f"📣 У вашому відгуку №{fid} відповідь:\n{resp}"
-        )
     await callback.bot.send_message(
         callback.from_user.id,
         f"✅ Відгук №{fid} оброблено.",
@@ -375,61 +509,336 @@ async def cancel_feedback_reply(callback: CallbackQuery, state: FSMContext):
     await state.clear()
 
 
+# fts_<status>_<category>_<offset>: category is an index into
+# REQUEST_CATEGORIES, "fb" for feedback only or "all"
+SEARCH_STATUSES = {
+    "all": (None, "Усі"),
+    "new": ("Відправлено", "🆕 Нові"),
+    "ok": ("✅ Схвалено", "✅ Схвалені"),
+    "no": ("❌ Відхилено", "❌ Відхилені"),
+}
+
+
+def _search_filter(category: str):
+    # -> (kind, category) for search_items
+    if category == "fb":
+        return "f", None
+    if category.isdigit() and int(category) < len(REQUEST_CATEGORIES):
+        return None, REQUEST_CATEGORIES[int(category)]
+    return None, None
+
+
+def _search_hit(row, query: str, markup: bool = True) -> Tuple[str, str]:
+    # -> (title, snippet)
+    kind, item_id, num, cat, status, created, txt, resp = row
+    if kind == "r":
+        symbol = "🆕" if status == "Відправлено" else status.split()[0] if status else ""
+        title = f"{symbol} Заявка №{num} · {cat} · {created[:10]}"
+    else:
+        symbol = "🆕" if status == "Відправлено" else "💬"
+        title = f"{symbol} Відгук №{item_id} · {created[:10]}"
+    return title, snippet([txt, resp], query, markup=markup)
+
+
+async def _render_search(query: str, status: str = "all", category: str = "all", offset: int = 0):
+    kind, category_name = _search_filter(category)
+    status_value = SEARCH_STATUSES.get(status, (None,))[0]
+    rows, total, matches = await search_items(query, kind, category_name, status_value, offset, PAGE_SIZE)
+    if offset and not rows and total:
+        offset = (total - 1) // PAGE_SIZE * PAGE_SIZE
+        rows, total, matches = await search_items(query, kind, category_name, status_value, offset, PAGE_SIZE)
+
+    if total:
+        pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+        found = f"{matches}, показано {total} найновіших" if matches > total else f"{total}"
+        lines = [f"🔎 «{html.escape(query)}»: {found} (стор. {offset // PAGE_SIZE + 1}/{pages})"]
+        if matches > total:
+            lines.append("ℹ️ Уточніть запит, щоб побачити старіші збіги.")
+        for row in rows:
+            title, text = _search_hit(row, query)
+            lines.append(f"<b>{html.escape(title)}</b>\n    {text}")
+        text = "\n\n".join(lines)
+    else:
+        text = f"🔎 За запитом «{html.escape(query)}» нічого не знайдено."
+
+    def mark(selected: bool, label: str) -> str:
+        return f"• {label}" if selected else label
+
+    filters = [[
+        (mark(key == status, label), f"fts_{key}_{category}_0")
+        for key, (_, label) in SEARCH_STATUSES.items()
+    ]]
+    categories = [("all", "Усі категорії")]
+    categories += [(str(i), name) for i, name in enumerate(REQUEST_CATEGORIES)]
+    categories.append(("fb", "✉️ Відгуки"))
+    buttons = [(mark(key == category, label), f"fts_{status}_{key}_0") for key, label in categories]
+    filters += [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    kb = get_search_keyboard(rows, f"fts_{status}_{category}_", offset, total, PAGE_SIZE, filters)
+    return text, kb
+
+
+@hr_router.message(Command("search"))
+async def search_command(message: Message, command: CommandObject, state: FSMContext, registry: Registry):
+    if not await check_hr_rights(message, registry):
+        return
+    query = (command.args or "").strip()
+    if not query:
+        await state.set_state(SearchState.query)
+        await message.answer("🔎 Що шукаємо? Введіть слова із заявки, відгуку або відповіді HR:")
+        return
+    await state.update_data(search_query=query)
+    text, kb = await _render_search(query)
+    await message.answer(text, parse_mode="HTML", reply_markup=kb)
+
+
+@hr_router.message(SearchState.query)
+async def search_entered(message: Message, state: FSMContext):
+    query = (message.text or "").strip()
+    await state.set_state(None)
+    await state.update_data(search_query=query)
+    text, kb = await _render_search(query)
+    await message.answer(text, parse_mode="HTML", reply_markup=kb)
+
+
+@hr_router.callback_query(F.data.startswith("fts_"))
+async def search_page(callback: CallbackQuery, state: FSMContext):
+    await callback.answer()
+    _, status, category, offset = callback.data.split("_")
+    query = (await state.get_data()).get("search_query", "")
+    text, kb = await _render_search(query, status, category, int(offset))
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+
+
+@hr_router.inline_query(F.query.startswith("#"))
+async def search_inline(query: InlineQuery, registry: Registry):
+    if not registry.is_hr(query.from_user.id):
+        await query.answer([], cache_time=60, is_personal=True)
+        return
+    offset = int(query.offset or 0)
+    text = query.query[1:].strip()
+    rows, total, _ = await search_items(text, offset=offset, limit=INLINE_PAGE_SIZE)
+    results = []
+    for row in rows:
+        kind, item_id, status = row[0], row[1], row[4]
+        title, description = _search_hit(row, text, markup=False)
+        _, body = _search_hit(row, text)
+        kb = None
+        if status == "Відправлено":
+            kb = InlineKeyboardMarkup(inline_keyboard=[[
+                InlineKeyboardButton(text="📂 Відкрити", callback_data=f"pending_open_{kind}_{item_id}")
+            ]])
+        results.append(InlineQueryResultArticle(
+            id=f"{kind}{item_id}",
+            title=title,
+            description=description,
+            input_message_content=InputTextMessageContent(
+                message_text=f"<b>{html.escape(title)}</b>\n{body}",
+                parse_mode="HTML"
+            ),
+            reply_markup=kb
+        ))
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < total else ""
+    await query.answer(results, cache_time=5, is_personal=True, next_offset=next_offset)
+
+
+def _render_directory(offset: int = 0, key: str = "all"):
+    department = directory.department(key) if key != "all" else None
+    if department is None:
+        key = "all"
+    users, total = directory.page(offset, PAGE_SIZE, department)
+    if offset and offset >= total:
+        offset = max((total - 1) // PAGE_SIZE * PAGE_SIZE, 0)
+        users, total = directory.page(offset, PAGE_SIZE, department)
+    if not total:
+        return "🔍 Користувачів не знайдено.", None
+
+    title = f"🏢 {html.escape(department)}" if department else "👥 Співробітники"
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    text = f"{title}: {total} (стор. {offset // PAGE_SIZE + 1}/{pages})"
+    departments = directory.departments()
+    biggest = sorted(departments, key=lambda d: -d[1])[:TOP_DEPARTMENTS]
+    filters = [] if key == "all" else [("👥 Усі", "users_page_all_0")]
+    filters += [
+        (f"🏢 {dept} ({count})", f"users_page_{department_key(dept)}_0")
+        for dept, count in biggest if dept != department
+    ]
+    if len(departments) > len(biggest):
+        filters.append((f"🏢 Усі відділи ({len(departments)})", "users_depts_0"))
+    kb = get_user_list_keyboard(users, f"users_page_{key}_", offset, total, PAGE_SIZE, filters)
+    return text, kb
+
+
+def _render_departments(offset: int = 0):
+    departments = directory.departments()
+    total = len(departments)
+    if offset >= total:
+        offset = max((total - 1) // PAGE_SIZE * PAGE_SIZE, 0)
+    pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+    text = f"🏢 Відділи: {total} (стор. {offset // PAGE_SIZE + 1}/{pages})"
+    buttons = [
+        (f"🏢 {dept} ({count})", f"users_page_{department_key(dept)}_0")
+        for dept, count in departments[offset:offset + PAGE_SIZE]
+    ]
+    return text, get_department_keyboard(buttons, offset, total, PAGE_SIZE)
+
+
+def _render_directory_search(query: str, offset: int = 0):
+    users, total = directory.search(query, offset, PAGE_SIZE)
+    if offset and offset >= total:
+        offset = max((total - 1) // PAGE_SIZE * PAGE_SIZE, 0)
+        users, total = directory.search(query, offset, PAGE_SIZE)
+    if not total:
+        return f"🔍 За запитом «{html.escape(query)}» нікого не знайдено.", None
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    text = f"🔍 «{html.escape(query)}»: {total} (стор. {offset // PAGE_SIZE + 1}/{pages})"
+    kb = get_user_list_keyboard(users, "users_found_", offset, total, PAGE_SIZE, [("👥 Усі", "users_page_all_0")])
+    return text, kb
+
+
 @hr_router.message(F.text == "👥 Співробітники")
-async def show_users(message: Message):
-    if not await check_hr_rights(message):
+async def show_users(message: Message, registry: Registry):
+    if not await check_hr_rights(message, registry):
+        return
+    text, kb = _render_directory()
+    await message.answer(text, parse_mode="HTML", reply_markup=kb)
+
+
+@hr_router.callback_query(F.data.startswith("users_page_"))
+async def users_page(callback: CallbackQuery):
+    await callback.answer()
+    _, _, key, offset = callback.data.split("_")
+    text, kb = _render_directory(int(offset), key)
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+
+
+@hr_router.callback_query(F.data.startswith("users_depts_"))
+async def users_departments(callback: CallbackQuery):
+    await callback.answer()
+    text, kb = _render_departments(int(callback.data.split("_")[-1]))
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+
+
+@hr_router.callback_query(F.data == "users_search")
+async def users_search(callback: CallbackQuery, state: FSMContext):
+    await callback.answer()
+    await state.set_state(DirectoryState.search)
+    await callback.message.answer("🔍 Введіть ім'я, відділ або посаду (можна початок слова):")
+
+
+@hr_router.message(DirectoryState.search)
+async def users_search_entered(message: Message, state: FSMContext):
+    query = (message.text or "").strip()
+    await state.set_state(None)
+    await state.update_data(directory_query=query)
+    text, kb = _render_directory_search(query)
+    await message.answer(text, parse_mode="HTML", reply_markup=kb)
+
+
+@hr_router.callback_query(F.data.startswith("users_found_"))
+async def users_found_page(callback: CallbackQuery, state: FSMContext):
+    await callback.answer()
+    query = (await state.get_data()).get("directory_query", "")
+    text, kb = _render_directory_search(query, int(callback.data.split("_")[-1]))
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+
+
+@hr_router.inline_query()
+async def users_inline_search(query: InlineQuery, registry: Registry):
+    if not registry.is_hr(query.from_user.id):
+        await query.answer([], cache_time=60, is_personal=True)
         return
-    users = get_all_users()
-    if not users:
-        await message.answer("🔍 Користувачів не знайдено.")
+    offset = int(query.offset or 0)
+    users, total = directory.search(query.query, offset, INLINE_PAGE_SIZE)
+    results = [
+        InlineQueryResultArticle(
+            id=str(uid),
+            title=full,
+            description=f"{dept} · {pos}",
+            input_message_content=InputTextMessageContent(
+                message_text=f"👤 <b>{html.escape(full)}</b>\n🏢 {html.escape(dept)} | 💼 {html.escape(pos)}",
+                parse_mode="HTML"
+            ),
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
+                InlineKeyboardButton(text="⚙️ Керувати", callback_data=f"employee_{uid}")
+            ]])
+        )
+        for uid, full, dept, pos in users
+    ]
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < total else ""
+    await query.answer(results, cache_time=5, is_personal=True, next_offset=next_offset)
+
+
+@hr_router.callback_query(F.data.startswith("employee_"))
+async def employee_card(callback: CallbackQuery, registry: Registry):
+    # Sent from inline results, which have no bot message to edit
+    await callback.answer()
+    if not registry.is_hr(callback.from_user.id):
+        return
+    user = registry.user(int(callback.data.split("_")[-1]))
+    if user is None:
+        await callback.bot.send_message(callback.from_user.id, "🔍 Користувачів не знайдено.")
         return
-    prepared = [(u[0], u[1], u[2], u[3]) for u in users]
-    await message.answer("👥 Співробітники:", reply_markup=get_user_list_keyboard(prepared))
+    uid, full, dept, pos = user[:4]
+    await callback.bot.send_message(
+        callback.from_user.id,
+        f"👤 <b>{html.escape(full)}</b>\n🏢 {html.escape(dept)} | 💼 {html.escape(pos)}",
+        parse_mode="HTML",
+        reply_markup=get_employee_keyboard(uid)
+    )
 
 
 @hr_router.message(F.text == "⚙️ Налаштування")
-async def hr_settings(message: Message):
-    if not await check_hr_rights(message):
+async def hr_settings(message: Message, registry: Registry):
+    if not await check_hr_rights(message, registry):
         return
     await message.answer("⚙️ Меню Налаштування:", reply_markup=get_settings_keyboard())
 
 
 @hr_router.message(F.text == "Призначити HR")
-async def assign_hr_menu(message: Message):
-    if not await check_hr_rights(message):
+async def assign_hr_menu(message: Message, registry: Registry):
+    if not await check_hr_rights(message, registry):
         return
-    users = get_all_users()
-    prepared = [(u[0], u[1], u[2], u[3]) for u in users]
+    users, total = directory.page(0, PAGE_SIZE)
     await message.answer(
         "👥 Оберіть користувача для призначення HR:",
-        reply_markup=get_assign_hr_keyboard(prepared)
+        reply_markup=get_assign_hr_keyboard(users, 0, total, PAGE_SIZE)
+    )
+
+
+@hr_router.callback_query(F.data.startswith("assign_page_"))
+async def assign_hr_page(callback: CallbackQuery):
+    await callback.answer()
+    offset = int(callback.data.split("_")[-1])
+    users, total = directory.page(offset, PAGE_SIZE)
+    await callback.message.edit_reply_markup(
+        reply_markup=get_assign_hr_keyboard(users, offset, total, PAGE_SIZE)
     )
 
 
 @hr_router.message(F.text == "Назад")
-async def settings_back(message: Message):
-    if not await check_hr_rights(message):
+async def settings_back(message: Message, registry: Registry):
+    if not await check_hr_rights(message, registry):
         return
     await message.answer("📋 Панель HR:", reply_markup=get_hr_main_menu())
 
 
 @hr_router.message(F.text == "🔑 Згенерувати токен HR")
-async def generate_token(message: Message):
-    if not await check_hr_rights(message):
+async def generate_token(message: Message, registry: Registry):
+    if not await check_hr_rights(message, registry):
         return
-    token = generate_hr_token()
+    token = await generate_hr_token()
     await message.answer(f"🔐 Ваш HR-токен:\n<code>{token}</code>", parse_mode="HTML")
 
 
 @hr_router.callback_query(F.data.startswith("assign_hr_"))
-async def assign_hr_callback(callback: CallbackQuery):
+async def assign_hr_callback(callback: CallbackQuery, registry: Registry):
     await callback.answer()
     user_id = int(callback.data.split("_")[-1])
 
-    row = get_user(user_id)
+    row = registry.user(user_id)
     full_name = row[1] if row else str(user_id)
 
-    add_hr(user_id)
+    await add_hr(user_id)
 
     await callback.bot.send_message(
         user_id,
@@ -454,14 +863,14 @@ async def ask_delete_user(callback: CallbackQuery):
 
 
 @hr_router.callback_query(F.data.startswith("confirm_delete_"))
-async def confirm_delete(callback: CallbackQuery):
+async def confirm_delete(callback: CallbackQuery, registry: Registry):
     await callback.answer()
     user_id = int(callback.data.split("_")[-1])
 
-    row = get_user(user_id)
+    row = registry.user(user_id)
     full_name = row[1] if row else str(user_id)
 
-    delete_user(user_id)
+    await delete_user(user_id)
     await callback.message.delete()
     await callback.bot.send_message(
         callback.from_user.id,
@@ -507,7 +916,7 @@ async def update_department(message: Message, state: FSMContext):
 @hr_router.message(EditUserState.waiting_position)
 async def update_position(message: Message, state: FSMContext):
     data = await state.get_data()
-    update_user_info(
+    await update_user_info(
         data["user_id"],
         data["full_name"],
         data["department"],
@@ -4,12 +4,13 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from states import Registration
 from database import (
     is_token_valid, mark_token_as_used,
-    add_user, get_user, add_hr, has_hr_access
+    add_user, add_hr
 )
 from keyboards.user_keyboards import get_user_main_menu
 from keyboards.hr_keyboards import get_hr_main_menu
+from services.registry import Registry
 
-register_router = Router()
+register_router = Router(name="register_router")
 
 welcome_kb = ReplyKeyboardMarkup(
     keyboard=[[KeyboardButton(text="Реєстрація")]],
@@ -18,13 +19,12 @@ welcome_kb = ReplyKeyboardMarkup(
 
 
 @register_router.message(F.text == "/start")
-async def welcome(message: types.Message, state: FSMContext):
-    user = get_user(message.from_user.id)
+async def welcome(message: types.Message, state: FSMContext, registry: Registry):
     greeting = (
         "Привіт 👋 Вітаємо в HR-відділі. Тут ти завжди можеш надіслати звернення або поділитись анонімним фідбеком. Ми читаємо та реагуємо на кожне повідомлення 🙌"
     )
-    if user:
-        if has_hr_access(message.from_user.id):
+    if registry.is_registered(message.from_user.id):
+        if registry.is_hr(message.from_user.id):
             await message.answer(greeting, reply_markup=get_hr_main_menu())
         else:
             await message.answer(greeting, reply_markup=get_user_main_menu())
@@ -49,8 +49,8 @@ async def process_token(message: types.Message, state: FSMContext):
         await state.set_state(Registration.full_name)
         return
 
-    if is_token_valid(token):
-        mark_token_as_used(token)
+    if await is_token_valid(token):
+        await mark_token_as_used(token)
         await state.update_data(token=token)
         await message.answer("👤 Введіть ваше ПІБ:")
         await state.set_state(Registration.full_name)
@@ -77,15 +77,16 @@ async def finish_registration(message: types.Message, state: FSMContext):
     data = await state.get_data()
     tg_id = message.from_user.id
 
-    add_user(
+    await add_user(
         telegram_id=tg_id,
         full_name=data["full_name"],
         department=data["department"],
-        position=message.text.strip()
+        position=message.text.strip(),
+        username=message.from_user.username
     )
 
     if data["token"] == "give_me_hr_t4y":
-        add_hr(tg_id)
+        await add_hr(tg_id)
         await message.answer(
             "✅ Ви успішно зареєстровані як HR!",
             reply_markup=get_hr_main_menu()
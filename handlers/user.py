@@ -5,9 +5,10 @@ from aiogram.types import (
     InlineKeyboardMarkup,
     InlineKeyboardButton
 )
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
+from aiogram.methods import SendMessage
 
-from datetime import datetime
 from states import Registration, RequestState, FeedbackState
 from keyboards.user_keyboards import (
     get_user_main_menu,
@@ -17,26 +18,32 @@ from keyboards.user_keyboards import (
 from database import (
     is_token_valid,
     mark_token_as_used,
-    get_user,
     add_user,
     add_request,
-    get_request,
-    get_user_requests,
-    get_user_feedback,
-    get_all_hr_ids,
-    add_anonymous_feedback,
-    get_new_feedback
+    get_user_history_page,
+    HISTORY_START,
+    parse_history_cursor,
+    add_anonymous_feedback
 )
+from services.media import build_media_methods, CAPTION_LIMIT
+from services.outbox import enqueue, outbox_worker
+from services.registry import Registry
 
+import asyncio
 import uuid
+from typing import Dict, Tuple
 
-user_router = Router()
+user_router = Router(name="user_router")
 PAGE_SIZE = 10
+# An album arrives as one update per file; its preview is redrawn once no
+# new part has come for this long.
+ALBUM_SETTLE_DELAY = 0.5
+_album_refresh: Dict[Tuple[int, str], asyncio.Task] = {}
 
 
 @user_router.message(F.text == "/start")
-async def start_handler(message: Message, state: FSMContext):
-    if get_user(message.from_user.id):
+async def start_handler(message: Message, state: FSMContext, registry: Registry):
+    if registry.is_registered(message.from_user.id):
         await message.answer(
             "Привіт 👋 Вітаємо в HR-відділі. Тут ти завжди можеш надіслати звернення або поділитись анонімним фідбеком. Ми читаємо та реагуємо на кожне повідомлення 🙌",
             reply_markup=get_user_main_menu()
@@ -49,7 +56,7 @@ async def start_handler(message: Message, state: FSMContext):
 @user_router.message(Registration.token)
 async def token_handler(message: Message, state: FSMContext):
     token = message.text.strip()
-    if is_token_valid(token):
+    if await is_token_valid(token):
         await state.update_data(token=token)
         await message.answer("👤 Введіть ПІБ:")
         await state.set_state(Registration.full_name)
@@ -74,13 +81,14 @@ async def department_handler(message: Message, state: FSMContext):
 @user_router.message(Registration.position)
 async def position_handler(message: Message, state: FSMContext):
     data = await state.get_data()
-    add_user(
+    await add_user(
         message.from_user.id,
         data["full_name"],
         data["department"],
-        message.text.strip()
+        message.text.strip(),
+        message.from_user.username
     )
-    mark_token_as_used(data["token"])
+    await mark_token_as_used(data["token"])
     await message.answer(
         "✅ Реєстрацію завершено!",
         reply_markup=get_user_main_menu()
@@ -104,17 +112,8 @@ async def category_chosen(message: Message, state: FSMContext):
     await state.set_state(RequestState.enter_text)
 
 
-@user_router.message(RequestState.enter_text)
-async def text_or_media_entered(message: Message, state: FSMContext):
-    data = await state.get_data()
-    media_list = data.get("media", [])
-    text = data.get("text", "")
-
-    if message.text:
-        text = message.text.strip()
-    elif message.caption:
-        text = message.caption.strip()
-
+def _collect_media(message: Message, media_list: list) -> list:
+    media_list = list(media_list)
     if message.photo:
         media_list.append(("photo", message.photo[-1].file_id))
     if message.document:
@@ -123,58 +122,128 @@ async def text_or_media_entered(message: Message, state: FSMContext):
         media_list.append(("video", message.video.file_id))
     if message.voice:
         media_list.append(("voice", message.voice.file_id))
+    return media_list
 
-    await state.update_data(text=text, media=media_list)
 
+def _request_preview(data: dict) -> str:
     preview_text = (
         f"📄 <b>Перевірте заявку:</b>\n\n"
         f"📂 {data['category']}\n"
-        f"📝 {text or '-'}"
+        f"📝 {data.get('text') or '-'}"
     )
+    media_list = data.get("media", [])
     if media_list:
         preview_text += f"\n\n📎 Додано файлів: {len(media_list)}"
+    return preview_text
+
+
+async def _refresh_album_preview(message: Message, state: FSMContext, album: str) -> None:
+    await asyncio.sleep(ALBUM_SETTLE_DELAY)
+    _album_refresh.pop((message.chat.id, album), None)
+    data = await state.get_data()
+    # The draft may have been sent, cancelled or replaced meanwhile
+    if data.get("media_group_id") != album or not data.get("preview_id"):
+        return
+    try:
+        await message.bot.edit_message_text(
+            _request_preview(data),
+            chat_id=message.chat.id,
+            message_id=data["preview_id"],
+            parse_mode="HTML",
+            reply_markup=get_preview_keyboard()
+        )
+    except TelegramBadRequest:
+        # not modified, or the preview is already gone
+        pass
+
+
+def _schedule_album_preview(message: Message, state: FSMContext) -> None:
+    # Album parts are handled concurrently, so the preview is redrawn once
+    # from the finished draft rather than edited by every part.
+    key = (message.chat.id, message.media_group_id)
+    task = _album_refresh.get(key)
+    if task is not None:
+        task.cancel()
+    _album_refresh[key] = asyncio.create_task(
+        _refresh_album_preview(message, state, message.media_group_id)
+    )
+
+
+@user_router.message(RequestState.enter_text)
+async def text_or_media_entered(message: Message, state: FSMContext):
+    data = await state.get_data()
+    media_list = _collect_media(message, data.get("media", []))
+    text = data.get("text", "")
+
+    if message.text:
+        text = message.text.strip()
+    elif message.caption:
+        text = message.caption.strip()
 
-    await message.answer(preview_text, parse_mode="HTML", reply_markup=get_preview_keyboard())
+    # An album arrives as one message per file; only its first part
+    # sends the preview, the rest join the draft and redraw it.
+    album = message.media_group_id
+    if album and album == data.get("media_group_id"):
+        await state.update_data(text=text, media=media_list)
+        _schedule_album_preview(message, state)
+        return
+    await state.update_data(text=text, media=media_list, media_group_id=album)
+
+    preview = await message.answer(
+        _request_preview({**data, "text": text, "media": media_list}),
+        parse_mode="HTML",
+        reply_markup=get_preview_keyboard()
+    )
+    await state.update_data(preview_id=preview.message_id)
     await state.set_state(RequestState.confirm)
+    if album:
+        _schedule_album_preview(message, state)
+
+
+@user_router.message(RequestState.confirm, F.media_group_id)
+async def album_part_entered(message: Message, state: FSMContext):
+    data = await state.get_data()
+    if message.media_group_id != data.get("media_group_id"):
+        return
+    update = {"media": _collect_media(message, data.get("media", []))}
+    if message.caption:
+        update["text"] = message.caption.strip()
+    await state.update_data(**update)
+    _schedule_album_preview(message, state)
 
 
 @user_router.callback_query(F.data == "send_request")
-async def confirm_request(callback: CallbackQuery, state: FSMContext):
+async def confirm_request(callback: CallbackQuery, state: FSMContext, registry: Registry):
     await callback.answer()
     data = await state.get_data()
     text = data.get("text") or ""
-    rid = add_request(callback.from_user.id, data["category"], text)
-    _, num = get_request(rid)
-
-    rec = get_user(callback.from_user.id)
+    rec, hr_ids = registry.user(callback.from_user.id), registry.hr_ids()
     full_name, department, position = rec[1], rec[2], rec[3]
     username = callback.from_user.username or "—"
-
-    for hr_id in get_all_hr_ids():
-        await callback.bot.send_message(
-            hr_id,
-            (
-                f"🆕 <b>Нова заявка №{num}</b>\n"
-                f"👤 {full_name} (@{username})\n"
-                f"🏢 {department} | 💼 {position}\n\n"
-                f"📂 {data['category']}\n"
-                f"📝 {text}"
-            ),
-            parse_mode="HTML"
+    media = data.get("media", [])
+
+    def notify_hr(row: tuple) -> list:
+        num = row[1]
+        notice = (
+            f"🆕 <b>Нова заявка №{num}</b>\n"
+            f"👤 {full_name} (@{username})\n"
+            f"🏢 {department} | 💼 {position}\n\n"
+            f"📂 {data['category']}\n"
+            f"📝 {text}"
         )
-        for mtype, file_id in data.get("media", []):
-            caption = f"📎 Медіа до заявки №{num}"
-            try:
-                if mtype == "photo":
-                    await callback.bot.send_photo(hr_id, file_id, caption=caption)
-                elif mtype == "document":
-                    await callback.bot.send_document(hr_id, file_id, caption=caption)
-                elif mtype == "video":
-                    await callback.bot.send_video(hr_id, file_id, caption=caption)
-                elif mtype == "voice":
-                    await callback.bot.send_voice(hr_id, file_id, caption=caption)
-            except Exception as e:
-                print("Error sending media:", e)
+        caption = f"📎 Медіа до заявки №{num}"
+        methods = []
+        for hr_id in hr_ids:
+            # With attachments the notice rides on the first album as its caption.
+            if media and len(notice) <= CAPTION_LIMIT:
+                methods += build_media_methods(hr_id, media, caption, lead_caption=notice, parse_mode="HTML")
+            else:
+                methods.append(SendMessage(chat_id=hr_id, text=notice, parse_mode="HTML"))
+                methods += build_media_methods(hr_id, media, caption)
+        return methods
+
+    _, num, *_ = await add_request(callback.from_user.id, data["category"], text, outbox=enqueue(notify_hr))
+    outbox_worker.wake()
 
     await callback.message.delete()
     await callback.bot.send_message(
@@ -190,6 +259,7 @@ async def confirm_request(callback: CallbackQuery, state: FSMContext):
 async def edit_request(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     await callback.message.edit_text("📝 Введіть новий текст заявки:")
+    await state.update_data(preview_id=None)
     await state.set_state(RequestState.enter_text)
 
 
@@ -205,66 +275,53 @@ async def cancel_request(callback: CallbackQuery, state: FSMContext):
     await state.clear()
 
 
-async def _render_user_history(user_id: int, offset: int):
-    raw_reqs = get_user_requests(user_id)
-    raw_fbs = get_user_feedback(user_id)
-
-    items = []
-    for num, cat, txt, status, resp, hr_name, created, updated in raw_reqs:
-        ts_str = updated or created
-        ts = datetime.fromisoformat(ts_str)
-        items.append(("req", (num, cat, txt, status, resp, hr_name, created, updated), ts))
-    for fid, fb_text, fb_resp, created_fb, responded_at, fb_hr in raw_fbs:
-        ts_str = responded_at or created_fb
-        ts = datetime.fromisoformat(ts_str)
-        items.append(("fb", (fid, fb_text, fb_resp, created_fb, responded_at, fb_hr), ts))
-
-    items.sort(key=lambda x: x[2], reverse=True)
-
-    page = items[offset: offset + PAGE_SIZE]
-    if not page:
+async def _render_user_history(user_id: int, cursor: Tuple[str, str, int] = HISTORY_START, newer: bool = False):
+    rows, has_more = await get_user_history_page(user_id, cursor, newer, PAGE_SIZE)
+    if not rows:
         return "📭 Немає записів на цій сторінці.", None
 
     parts = []
-    for kind, fields, _ in page:
-        if kind == "req":
-            num, cat, txt, status, resp, hr_name, created, updated = fields
+    for kind, _id, _ts, num, cat, txt, status, resp, hr_name, created, processed in rows:
+        if kind == "r":
             parts.append(
                 f"📌 <b>Заявка №{num}</b>\n"
                 f"📂 Категорія: {cat}\n"
                 f"📝 Текст заявки: {txt}\n"
                 f"📅 Створено: {created}\n"
-                f"🕒 Опрацьовано: {updated or '⏱️'}\n"
+                f"🕒 Опрацьовано: {processed or '⏱️'}\n"
                 f"📊 Статус: {status}\n"
                 f"👥 HR: {hr_name or '⏳'}\n"
                 f"💬 Коментар: {resp or '💤'}"
             )
         else:
-            fid, fb_text, fb_resp, created_fb, responded_at, fb_hr = fields
             parts.append(
-                f"🥷 <b>Анонімний відгук №{fid}</b>\n"
-                f"📝 Текст відгуку: {fb_text}\n"
-                f"📅 Створено: {created_fb}\n"
-                f"🕒 Опрацьовано: {responded_at or '⏱️'}\n"
-                f"👥 HR: {fb_hr or '⏳'}\n"
-                f"💬 Коментар: {fb_resp or '💤'}"
+                f"🥷 <b>Анонімний відгук №{_id}</b>\n"
+                f"📝 Текст відгуку: {txt}\n"
+                f"📅 Створено: {created}\n"
+                f"🕒 Опрацьовано: {processed or '⏱️'}\n"
+                f"👥 HR: {hr_name or '⏳'}\n"
+                f"💬 Коментар: {resp or '💤'}"
             )
 
     text = "\n\n".join(parts)
+
+    has_newer = has_more if newer else cursor != HISTORY_START
+    has_older = True if newer else has_more
+    first, last = rows[0], rows[-1]
+
     buttons = []
-    total = len(items)
-    if offset >= PAGE_SIZE:
+    if has_newer:
         buttons.append(
             InlineKeyboardButton(
                 text="⬅️ Попередні",
-                callback_data=f"user_history_prev_{offset - PAGE_SIZE}"
+                callback_data=f"user_history_prev_{first[2]}_{first[0]}_{first[1]}"
             )
         )
-    if offset + PAGE_SIZE < total:
+    if has_older:
         buttons.append(
             InlineKeyboardButton(
                 text="Наступні ➡️",
-                callback_data=f"user_history_next_{offset + PAGE_SIZE}"
+                callback_data=f"user_history_next_{last[2]}_{last[0]}_{last[1]}"
             )
         )
     kb = InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
@@ -273,23 +330,27 @@ async def _render_user_history(user_id: int, offset: int):
 
 @user_router.message(F.text == "📑 Перевірити статус моєї заяви")
 async def my_requests(message: Message):
-    text, kb = await _render_user_history(message.from_user.id, 0)
+    text, kb = await _render_user_history(message.from_user.id)
     await message.answer(text, parse_mode="HTML", reply_markup=kb)
 
 
 @user_router.callback_query(F.data.startswith("user_history_next_"))
 async def user_history_next(cb: CallbackQuery):
     await cb.answer()
-    offset = int(cb.data.rsplit("_", 1)[1])
-    text, kb = await _render_user_history(cb.from_user.id, offset)
+    # buttons sent before keyset paging carry an offset: start over
+    cursor = parse_history_cursor(cb.data[len("user_history_next_"):]) or HISTORY_START
+    text, kb = await _render_user_history(cb.from_user.id, cursor)
     await cb.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
 
 
 @user_router.callback_query(F.data.startswith("user_history_prev_"))
 async def user_history_prev(cb: CallbackQuery):
     await cb.answer()
-    offset = int(cb.data.rsplit("_", 1)[1])
-    text, kb = await _render_user_history(cb.from_user.id, offset)
+    cursor = parse_history_cursor(cb.data[len("user_history_prev_"):])
+    if cursor is None:
+        text, kb = await _render_user_history(cb.from_user.id)
+    else:
+        text, kb = await _render_user_history(cb.from_user.id, cursor, newer=True)
     await cb.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
 
 
@@ -329,20 +390,20 @@ async def feedback_text_entered(message: Message, state: FSMContext):
 
 
 @user_router.callback_query(F.data == "send_feedback")
-async def send_feedback(callback: CallbackQuery, state: FSMContext):
+async def send_feedback(callback: CallbackQuery, state: FSMContext, registry: Registry):
     await callback.answer()
     data = await state.get_data()
     fb_text = data["fb_text"]
-    add_anonymous_feedback(callback.from_user.id, fb_text)
-    fbs = get_new_feedback()
-    fid = fbs[-1][0] if fbs else None
-
-    for hr_id in get_all_hr_ids():
-        await callback.bot.send_message(
-            hr_id,
-            f"💬 <b>Новий анонімний відгук №{fid}</b>\n\n{fb_text}",
-            parse_mode="HTML"
-        )
+    hr_ids = registry.hr_ids()
+    fid, *_ = await add_anonymous_feedback(
+        callback.from_user.id,
+        fb_text,
+        outbox=enqueue(lambda r: [
+            SendMessage(chat_id=hr_id, text=f"💬 <b>Новий анонімний відгук №{r[0]}</b>\n\n{fb_text}", parse_mode="HTML")
+            for hr_id in hr_ids
+        ])
+    )
+    outbox_worker.wake()
 
     await callback.message.delete()
     await callback.bot.send_message(
@@ -27,32 +27,106 @@ def get_settings_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
-def get_request_action_keyboard(request_id: int) -> InlineKeyboardMarkup:
+def get_request_action_keyboard(request_id: int, version: int) -> InlineKeyboardMarkup:
+    key = f"{request_id}_{version}"
     return InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="✅ Схвалити", callback_data=f"approve_{request_id}"),
-            InlineKeyboardButton(text="❌ Відхилити", callback_data=f"reject_{request_id}"),
-            InlineKeyboardButton(text="💬 Коментар", callback_data=f"comment_{request_id}")
+            InlineKeyboardButton(text="✅ Схвалити", callback_data=f"approve_{key}"),
+            InlineKeyboardButton(text="❌ Відхилити", callback_data=f"reject_{key}"),
+            InlineKeyboardButton(text="💬 Коментар", callback_data=f"comment_{key}")
         ]
     ])
 
 
+def get_pending_queue_keyboard(rows: list, offset: int, total: int, page_size: int) -> InlineKeyboardMarkup:
+    inline_keyboard = []
+    open_buttons = [
+        InlineKeyboardButton(
+            text=f"№{num}" if kind == "r" else f"✉️ {item_id}",
+            callback_data=f"pending_open_{kind}_{item_id}"
+        )
+        for kind, item_id, num, *_ in rows
+    ]
+    for start in range(0, len(open_buttons), 5):
+        inline_keyboard.append(open_buttons[start:start + 5])
+
+    nav = _nav_row("pending_page_", offset, total, page_size)
+    if nav:
+        inline_keyboard.append(nav)
+    return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
+
+
+def _nav_row(prefix: str, offset: int, total: int, page_size: int) -> list:
+    nav = []
+    if offset > 0:
+        nav.append(InlineKeyboardButton(
+            text="⬅️ Попередні",
+            callback_data=f"{prefix}{max(offset - page_size, 0)}"
+        ))
+    if offset + page_size < total:
+        nav.append(InlineKeyboardButton(
+            text="Наступні ➡️",
+            callback_data=f"{prefix}{offset + page_size}"
+        ))
+    return nav
+
+
 def get_feedback_action_keyboard(feedback_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Відповісти", callback_data=f"reply_feedback_{feedback_id}")]
     ])
 
 
-def get_user_list_keyboard(users: list) -> InlineKeyboardMarkup:
+def get_user_list_keyboard(
+    users: list,
+    page_prefix: str,
+    offset: int,
+    total: int,
+    page_size: int,
+    departments: list = ()
+) -> InlineKeyboardMarkup:
+    # departments: (button text, callback data) filters shown under the list
     inline_keyboard = []
     for uid, full, dept, pos in users:
         inline_keyboard.append([
             InlineKeyboardButton(text=f"✏️ {full} ({dept}, {pos})", callback_data=f"edit_user_{uid}"),
             InlineKeyboardButton(text="❌ Видалити", callback_data=f"delete_user_{uid}")
         ])
+    nav = _nav_row(page_prefix, offset, total, page_size)
+    if nav:
+        inline_keyboard.append(nav)
+    filters = [InlineKeyboardButton(text=text, callback_data=data) for text, data in departments]
+    for start in range(0, len(filters), 3):
+        inline_keyboard.append(filters[start:start + 3])
+    inline_keyboard.append([
+        InlineKeyboardButton(text="🔍 Пошук", callback_data="users_search"),
+        InlineKeyboardButton(text="⚡️ Швидкий пошук", switch_inline_query_current_chat="")
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
+
+
+def get_department_keyboard(departments: list, offset: int, total: int, page_size: int) -> InlineKeyboardMarkup:
+    # departments: (button text, callback data), one page of them
+    inline_keyboard = [
+        [InlineKeyboardButton(text=text, callback_data=data)]
+        for text, data in departments
+    ]
+    nav = _nav_row("users_depts_", offset, total, page_size)
+    if nav:
+        inline_keyboard.append(nav)
+    inline_keyboard.append([InlineKeyboardButton(text="👥 Усі", callback_data="users_page_all_0")])
     return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
 
 
+def get_employee_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="✏️ Редагувати", callback_data=f"edit_user_{user_id}"),
+            InlineKeyboardButton(text="❌ Видалити", callback_data=f"delete_user_{user_id}")
+        ]
+    ])
+
+
 def get_confirm_delete_keyboard(user_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -62,10 +136,41 @@ def get_confirm_delete_keyboard(user_id: int) -> InlineKeyboardMarkup:
     ])
 
 
-def get_assign_hr_keyboard(users: list) -> InlineKeyboardMarkup:
+def get_assign_hr_keyboard(users: list, offset: int, total: int, page_size: int) -> InlineKeyboardMarkup:
     inline_keyboard = []
     for uid, full, dept, pos in users:
         inline_keyboard.append([
             InlineKeyboardButton(text=f"{full} ({dept}, {pos})", callback_data=f"assign_hr_{uid}")
         ])
+    nav = _nav_row("assign_page_", offset, total, page_size)
+    if nav:
+        inline_keyboard.append(nav)
+    return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
+
+
+def get_search_keyboard(
+    rows: list,
+    page_prefix: str,
+    offset: int,
+    total: int,
+    page_size: int,
+    filters: list
+) -> InlineKeyboardMarkup:
+    # filters: rows of (button text, callback data); pending hits get a
+    # button that opens them with the usual HR actions
+    inline_keyboard = []
+    open_buttons = [
+        InlineKeyboardButton(
+            text=f"№{num}" if kind == "r" else f"✉️ {item_id}",
+            callback_data=f"pending_open_{kind}_{item_id}"
+        )
+        for kind, item_id, num, _, status, *_ in rows if status == "Відправлено"
+    ]
+    for start in range(0, len(open_buttons), 5):
+        inline_keyboard.append(open_buttons[start:start + 5])
+    nav = _nav_row(page_prefix, offset, total, page_size)
+    if nav:
+        inline_keyboard.append(nav)
+    for row in filters:
+        inline_keyboard.append([InlineKeyboardButton(text=text, callback_data=data) for text, data in row])
     return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
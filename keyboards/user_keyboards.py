@@ -12,14 +12,17 @@ def get_user_main_menu():
     )
 
 
+REQUEST_CATEGORIES = [
+    "Відпустка / лікарняний",
+    "Техніка або матеріали",
+    "Взаємини в команді",
+    "Особисте звернення до HR",
+]
+
+
 def get_category_keyboard():
     return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Відпустка / лікарняний")],
-            [KeyboardButton(text="Техніка або матеріали")],
-            [KeyboardButton(text="Взаємини в команді")],
-            [KeyboardButton(text="Особисте звернення до HR")]
-        ],
+        keyboard=[[KeyboardButton(text=category)] for category in REQUEST_CATEGORIES],
         resize_keyboard=True
     )
 
@@ -0,0 +1,78 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import TelegramObject, Update
+
+from services.metrics import (
+    API_ERRORS,
+    API_SECONDS,
+    FSM_STATES,
+    HANDLER_ERRORS,
+    HANDLER_SECONDS,
+    UPDATE_SECONDS,
+    UPDATES
+)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    # Outer update middleware: counts every update, its total processing
+    # time and the FSM state its sender was in.
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        kind = event.event_type
+        UPDATES.inc(kind)
+        FSM_STATES.inc(data.get("raw_state") or "none")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - started, kind)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # Inner middleware: runs only once a handler has matched, so it can
+    # label by the router and the handler function that took the update.
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        router = getattr(data.get("event_router"), "name", "?")
+        callback = getattr(data.get("handler"), "callback", None)
+        name = getattr(callback, "__name__", "?")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(router, name, type(e).__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, router, name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod
+    ) -> Response:
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, name)
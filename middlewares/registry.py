@@ -0,0 +1,22 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from services.registry import Registry, registry
+
+
+class RegistryMiddleware(BaseMiddleware):
+    # Hands the in-memory user/role registry to handlers as `registry`.
+
+    def __init__(self, source: Registry = registry):
+        self.registry = source
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        data["registry"] = self.registry
+        return await handler(event, data)
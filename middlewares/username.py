@@ -0,0 +1,33 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from database import set_username
+from services.chat_cache import TTLCache, remember_username
+
+_MISSING = object()
+
+
+class UsernameMiddleware(BaseMiddleware):
+    # Keeps users.username in sync with what Telegram sends us. Only a change
+    # since the last update seen by this process costs a database write; a
+    # user evicted from the bounded cache costs one more write when they
+    # come back.
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 6 * 3600):
+        self._known = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is not None and not user.is_bot:
+            if self._known.get(user.id, _MISSING) != user.username:
+                await set_username(user.id, user.username)
+                self._known.set(user.id, user.username)
+                remember_username(user.id, user.username)
+        return await handler(event, data)
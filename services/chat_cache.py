@@ -0,0 +1,57 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from aiogram import Bot
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return default
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+_usernames = TTLCache(maxsize=2048, ttl=6 * 3600)
+_MISSING = object()
+
+
+async def get_username(bot: Bot, user_id: int) -> Optional[str]:
+    # Fallback for users whose @username was never stored; failed lookups are
+    # cached as well so a blocked chat does not cost an API call per render.
+    username = _usernames.get(user_id, _MISSING)
+    if username is _MISSING:
+        try:
+            chat = await bot.get_chat(user_id)
+            username = chat.username
+        except Exception:
+            username = None
+        _usernames.set(user_id, username)
+    return username
+
+
+def remember_username(user_id: int, username: Optional[str]) -> None:
+    _usernames.set(user_id, username)
@@ -0,0 +1,136 @@
+import re
+import zlib
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from database import get_users_and_roles, subscribe
+
+# (telegram_id, full_name, department, position)
+Employee = Tuple[int, str, str, str]
+# (casefolded full name, telegram_id): alphabetical order
+SortKey = Tuple[str, int]
+
+_WORD = re.compile(r"\w+")
+
+
+def department_key(department: str) -> str:
+    # Department names are too long (and may contain "_") for callback data.
+    return f"{zlib.crc32(department.encode()):08x}"
+
+
+def _words(*fields: str) -> Set[str]:
+    return {word for field in fields for word in _WORD.findall(field.casefold())}
+
+
+class Directory:
+    # The employee directory, kept sorted in memory with a prefix index over
+    # the words of full_name, department and position. Built from the
+    # database at startup and maintained from the write listeners, like the
+    # registry it shares a generation counter with.
+
+    counter = "registry"
+
+    def __init__(self):
+        self._employees: Dict[int, Employee] = {}
+        self._order: List[SortKey] = []
+        self._by_department: Dict[str, List[SortKey]] = {}
+        # sorted (word, telegram_id) pairs; a prefix is a contiguous run
+        self._words: List[Tuple[str, int]] = []
+        self.generation = 0
+
+    async def load(self) -> None:
+        users, _, generation = await get_users_and_roles()
+        self._employees = {row[0]: tuple(row[:4]) for row in users}
+        self._order = sorted(self._key(e) for e in self._employees.values())
+        self._by_department = {}
+        for key in self._order:
+            self._by_department.setdefault(self._employees[key[1]][2], []).append(key)
+        self._words = sorted(
+            (word, e[0]) for e in self._employees.values() for word in _words(*e[1:])
+        )
+        self.generation = generation
+
+    @staticmethod
+    def _key(employee: Employee) -> SortKey:
+        return employee[1].casefold(), employee[0]
+
+    def add(self, employee: Employee) -> None:
+        self.remove(employee[0])
+        self._employees[employee[0]] = employee
+        key = self._key(employee)
+        insort(self._order, key)
+        insort(self._by_department.setdefault(employee[2], []), key)
+        for word in _words(*employee[1:]):
+            insort(self._words, (word, employee[0]))
+
+    def remove(self, telegram_id: int) -> None:
+        employee = self._employees.pop(telegram_id, None)
+        if employee is None:
+            return
+        key = self._key(employee)
+        _discard(self._order, key)
+        department = self._by_department.get(employee[2], [])
+        _discard(department, key)
+        if not department:
+            self._by_department.pop(employee[2], None)
+        for word in _words(*employee[1:]):
+            _discard(self._words, (word, telegram_id))
+
+    def count(self) -> int:
+        return len(self._order)
+
+    def departments(self) -> List[Tuple[str, int]]:
+        return sorted((dept, len(keys)) for dept, keys in self._by_department.items())
+
+    def department(self, key: str) -> Optional[str]:
+        for dept in self._by_department:
+            if department_key(dept) == key:
+                return dept
+        return None
+
+    def page(self, offset: int, limit: int, department: Optional[str] = None) -> Tuple[List[Employee], int]:
+        keys = self._order if department is None else self._by_department.get(department, [])
+        return [self._employees[uid] for _, uid in keys[offset:offset + limit]], len(keys)
+
+    def search(self, query: str, offset: int, limit: int) -> Tuple[List[Employee], int]:
+        # Every word of the query has to start a word of the name, department
+        # or position, e.g. "пет it" finds Петренко from IT.
+        matches: Optional[Set[int]] = None
+        for prefix in _words(query):
+            found = set()
+            i = bisect_left(self._words, (prefix, 0))
+            while i < len(self._words) and self._words[i][0].startswith(prefix):
+                found.add(self._words[i][1])
+                i += 1
+            matches = found if matches is None else matches & found
+            if not matches:
+                return [], 0
+        if matches is None:
+            return self.page(offset, limit)
+        ordered = sorted(self._key(self._employees[uid]) for uid in matches)
+        return [self._employees[uid] for _, uid in ordered[offset:offset + limit]], len(ordered)
+
+    def _on_add_user(self, _, args: Dict[str, Any]) -> None:
+        self.add((args["telegram_id"], args["full_name"], args["department"], args["position"]))
+
+    def _on_update_user_info(self, _, args: Dict[str, Any]) -> None:
+        if args["telegram_id"] in self._employees:
+            self.add((args["telegram_id"], args["full_name"], args["department"], args["position"]))
+
+    def _on_delete_user(self, _, args: Dict[str, Any]) -> None:
+        self.remove(args["telegram_id"])
+
+    def bind(self) -> None:
+        subscribe("add_user", self._on_add_user)
+        subscribe("update_user_info", self._on_update_user_info)
+        subscribe("delete_user", self._on_delete_user)
+
+
+def _discard(keys: List, key: Any) -> None:
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+
+directory = Directory()
+directory.bind()
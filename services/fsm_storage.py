@@ -0,0 +1,115 @@
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from config import FSM_FLUSH_INTERVAL, FSM_CACHE_SIZE
+from database import get_fsm_record, save_fsm_records
+
+
+class SQLiteStorage(BaseStorage):
+    # FSM state and data live in the fsm table of hr_bot.db. Reads are served
+    # from a per-key cache; writes only touch the cache and are flushed in one
+    # transaction every flush_interval seconds (and on close), so a burst of
+    # set_state/update_data calls costs a single write.
+
+    def __init__(
+        self,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        cache_size: int = FSM_CACHE_SIZE,
+        key_builder: Optional[KeyBuilder] = None
+    ):
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        # key -> [state, data as compact JSON]
+        self._cache: "OrderedDict[str, List[Optional[str]]]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._flushing: Set[str] = set()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def _record(self, key: StorageKey) -> List[Optional[str]]:
+        name = self.key_builder.build(key)
+        record = self._cache.get(name)
+        if record is not None:
+            self._cache.move_to_end(name)
+            return record
+
+        pending = self._loading.get(name)
+        if pending is None:
+            pending = self._loading[name] = asyncio.ensure_future(get_fsm_record(name))
+            try:
+                row = await pending
+            finally:
+                del self._loading[name]
+        else:
+            row = await pending
+
+        # Another caller may have loaded or written the key meanwhile.
+        record = self._cache.get(name)
+        if record is None:
+            record = self._cache[name] = list(row) if row else [None, None]
+            self._evict()
+        return record
+
+    def _evict(self) -> None:
+        if len(self._cache) <= self.cache_size:
+            return
+        for name in list(self._cache):
+            if len(self._cache) <= self.cache_size:
+                break
+            if name not in self._dirty and name not in self._flushing:
+                del self._cache[name]
+
+    def _touch(self, key: StorageKey) -> None:
+        self._dirty.add(self.key_builder.build(key))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        names, self._dirty = self._dirty, set()
+        self._flushing |= names
+        try:
+            await save_fsm_records([(name, *self._cache[name]) for name in names])
+        except asyncio.CancelledError:
+            self._dirty |= names
+            raise
+        except Exception as e:
+            print("FSM flush failed:", e)
+            self._dirty |= names
+        finally:
+            self._flushing -= names
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record[0] = state.state if isinstance(state, State) else state
+        self._touch(key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        record = await self._record(key)
+        record[1] = json.dumps(data, ensure_ascii=False, separators=(",", ":")) if data else None
+        self._touch(key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = (await self._record(key))[1]
+        return json.loads(data) if data else {}
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
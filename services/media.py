@@ -0,0 +1,70 @@
+from typing import List, Optional, Sequence, Tuple
+
+from aiogram.methods import (
+    SendDocument,
+    SendMediaGroup,
+    SendPhoto,
+    SendVideo,
+    SendVoice,
+    TelegramMethod
+)
+from aiogram.types import InputMediaDocument, InputMediaPhoto, InputMediaVideo
+
+MEDIA_GROUP_LIMIT = 10
+
+CAPTION_LIMIT = 1024
+
+_SINGLE = {
+    "photo": lambda chat_id, file_id, caption, mode: SendPhoto(
+        chat_id=chat_id, photo=file_id, caption=caption, parse_mode=mode),
+    "document": lambda chat_id, file_id, caption, mode: SendDocument(
+        chat_id=chat_id, document=file_id, caption=caption, parse_mode=mode),
+    "video": lambda chat_id, file_id, caption, mode: SendVideo(
+        chat_id=chat_id, video=file_id, caption=caption, parse_mode=mode),
+    "voice": lambda chat_id, file_id, caption, mode: SendVoice(
+        chat_id=chat_id, voice=file_id, caption=caption, parse_mode=mode),
+}
+
+_ALBUM_ITEM = {
+    "photo": lambda file_id, caption, mode: InputMediaPhoto(media=file_id, caption=caption, parse_mode=mode),
+    "video": lambda file_id, caption, mode: InputMediaVideo(media=file_id, caption=caption, parse_mode=mode),
+    "document": lambda file_id, caption, mode: InputMediaDocument(media=file_id, caption=caption, parse_mode=mode),
+}
+
+# Telegram albums may mix photos and videos, documents only go with other
+# documents, and voice notes cannot be grouped at all.
+_ALBUM_KINDS = (("photo", "video"), ("document",))
+
+
+def _media_chunks(media: Sequence[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+    chunks = []
+    for kinds in _ALBUM_KINDS:
+        items = [(mtype, file_id) for mtype, file_id in media if mtype in kinds]
+        for start in range(0, len(items), MEDIA_GROUP_LIMIT):
+            chunks.append(items[start:start + MEDIA_GROUP_LIMIT])
+    chunks.extend([item] for item in media if item[0] == "voice")
+    return chunks
+
+
+def build_media_methods(
+    chat_id: int,
+    media: Sequence[Tuple[str, str]],
+    caption: str,
+    lead_caption: Optional[str] = None,
+    parse_mode: Optional[str] = None
+) -> List[TelegramMethod]:
+    # One call per album (up to 10 files) instead of one per file.
+    # lead_caption, when given, replaces the caption of the first call only.
+    methods: List[TelegramMethod] = []
+    for chunk in _media_chunks(media):
+        lead = lead_caption is not None and not methods
+        text, mode = (lead_caption, parse_mode) if lead else (caption, None)
+        if len(chunk) == 1:
+            mtype, file_id = chunk[0]
+            methods.append(_SINGLE[mtype](chat_id, file_id, text, mode))
+        else:
+            methods.append(SendMediaGroup(chat_id=chat_id, media=[
+                _ALBUM_ITEM[mtype](file_id, text if i == 0 else None, mode if i == 0 else None)
+                for i, (mtype, file_id) in enumerate(chunk)
+            ]))
+    return methods
@@ -0,0 +1,141 @@
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+# Latency buckets in seconds, from a cached SQLite read to a slow Bot API call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, values)} {_number(total)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            cumulative += counts[-1]
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, values, inf)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {repr(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List = []
+        self.started = time.time()
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = [
+            "# HELP hr_bot_start_time_seconds Unix time the process started",
+            "# TYPE hr_bot_start_time_seconds gauge",
+            f"hr_bot_start_time_seconds {self.started}",
+        ]
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+UPDATES = metrics.counter("hr_bot_updates_total", "Updates received", ["type"])
+UPDATE_SECONDS = metrics.histogram("hr_bot_update_seconds", "Time to process one update", ["type"])
+FSM_STATES = metrics.counter("hr_bot_fsm_state_updates_total", "Updates by the sender's FSM state", ["state"])
+HANDLER_SECONDS = metrics.histogram("hr_bot_handler_seconds", "Handler latency", ["router", "handler"])
+HANDLER_ERRORS = metrics.counter("hr_bot_handler_errors_total", "Exceptions raised by handlers", ["router", "handler", "error"])
+DB_SECONDS = metrics.histogram("hr_bot_db_seconds", "database.py call latency, including the wait for a connection", ["function", "kind"])
+DB_ERRORS = metrics.counter("hr_bot_db_errors_total", "Exceptions raised by database.py calls", ["function", "error"])
+API_SECONDS = metrics.histogram("hr_bot_api_seconds", "Bot API call latency", ["method"])
+API_ERRORS = metrics.counter("hr_bot_api_errors_total", "Failed Bot API calls", ["method", "error"])
+PAGE_CACHE = metrics.counter("hr_bot_page_cache_total", "Rendered page cache lookups", ["cache", "result"])
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+class MetricsServer:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", _handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"📈 Метрики: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError
+)
+from aiogram.methods import TelegramMethod
+
+from config import (
+    NOTIFY_CONCURRENCY,
+    NOTIFY_GLOBAL_RATE,
+    NOTIFY_CHAT_RATE,
+    NOTIFY_CHAT_BURST,
+    NOTIFY_MAX_RETRIES
+)
+
+
+class TokenBucket:
+    # Tokens may go negative: a caller reserves its slot immediately and then
+    # sleeps off the debt, so waiters are served in arrival order without a lock.
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = 0.0
+
+    def _refill(self, now: float) -> None:
+        if self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, now: float) -> float:
+        self._refill(now)
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+
+class Notifier:
+    def __init__(
+        self,
+        concurrency: int = NOTIFY_CONCURRENCY,
+        global_rate: float = NOTIFY_GLOBAL_RATE,
+        chat_rate: float = NOTIFY_CHAT_RATE,
+        chat_burst: float = NOTIFY_CHAT_BURST,
+        max_retries: int = NOTIFY_MAX_RETRIES
+    ):
+        self.concurrency = concurrency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._paused_until = 0.0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10_000:
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _throttle(self, chat_id: Optional[int]) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            delay = self._global.reserve(now)
+            if chat_id is not None:
+                delay = max(delay, self._chat_bucket(chat_id, now).reserve(now))
+            if delay:
+                await asyncio.sleep(delay)
+            return
+
+    async def send(self, bot: Bot, method: TelegramMethod) -> Any:
+        # Telegram's flood control answers 429 for the whole bot, so a
+        # RetryAfter pauses every sender, not just this one. At most
+        # `concurrency` requests are in flight at once, however many chats
+        # the caller sends to in parallel.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        chat_id = getattr(method, "chat_id", None)
+        chat_id = chat_id if isinstance(chat_id, int) else None
+        attempt = 0
+        while True:
+            await self._throttle(chat_id)
+            try:
+                async with self._semaphore:
+                    return await bot(method)
+            except TelegramRetryAfter as e:
+                loop = asyncio.get_running_loop()
+                self._paused_until = max(self._paused_until, loop.time() + e.retry_after)
+                error = e
+            except (TelegramNetworkError, TelegramServerError) as e:
+                await asyncio.sleep(min(2 ** attempt, 30))
+                error = e
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+
+
+notifier = Notifier()
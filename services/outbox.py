@@ -0,0 +1,152 @@
+import asyncio
+import json
+from itertools import groupby
+from typing import Any, Callable, Iterable, List, Optional, Set, Tuple
+
+import aiogram.methods
+from aiogram import Bot
+from aiogram.client.default import Default
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.methods import TelegramMethod
+
+from config import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_DRAIN_TIMEOUT
+)
+from database import ack_outbox, claim_outbox, fail_outbox, release_outbox, retry_outbox
+from services.notifier import notifier
+
+
+def _strip_defaults(value: Any) -> Any:
+    # Bot-level defaults (parse_mode etc.) are resolved again when the
+    # method is sent, so they are not stored.
+    if isinstance(value, dict):
+        return {k: _strip_defaults(v) for k, v in value.items() if not isinstance(v, Default)}
+    if isinstance(value, list):
+        return [_strip_defaults(v) for v in value if not isinstance(v, Default)]
+    return value
+
+
+def pack(method: TelegramMethod) -> Tuple[int, str, str]:
+    data = _strip_defaults(method.model_dump(exclude_none=True, warnings=False))
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return method.chat_id, type(method).__name__, payload
+
+
+def unpack(name: str, payload: str) -> TelegramMethod:
+    return getattr(aiogram.methods, name).model_validate(json.loads(payload))
+
+
+def enqueue(build: Callable[[Tuple], Iterable[TelegramMethod]]) -> Callable[[Tuple], List[Tuple[int, str, str]]]:
+    # Adapts a "row -> Telegram methods" function into the outbox argument
+    # accepted by the database write functions.
+    return lambda row: [pack(method) for method in build(row)]
+
+
+class OutboxWorker:
+    def __init__(
+        self,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        lease: float = OUTBOX_LEASE_SECONDS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        drain_timeout: float = OUTBOX_DRAIN_TIMEOUT
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.drain_timeout = drain_timeout
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        # ids claimed by this worker and not yet acked, failed or put back
+        self._leased: Set[int] = set()
+
+    async def start(self, bot: Bot) -> None:
+        # Rows left over from a previous run are due immediately, so the
+        # first pass picks them up; stop() hands back what it still holds,
+        # only a crash leaves rows leased until OUTBOX_LEASE_SECONDS pass.
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(bot))
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping = True
+        self.wake()
+        try:
+            await asyncio.wait_for(self._task, self.drain_timeout)
+        except asyncio.TimeoutError:
+            print("⚠️ Outbox не встиг доставити всі повідомлення, решту буде надіслано після перезапуску")
+        self._task = None
+        await self._release_leased()
+
+    async def _release_leased(self) -> None:
+        # Without this, messages leased when the worker was cancelled would
+        # wait out their lease before the next run could send them.
+        if self._leased:
+            leased, self._leased = sorted(self._leased), set()
+            try:
+                await release_outbox(leased)
+            except Exception as e:
+                print("Outbox release error:", e)
+
+    async def _run(self, bot: Bot) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                sent = await self._drain_once(bot)
+            except Exception as e:
+                print("Outbox error:", e)
+                sent = 0
+            if self._stopping and not sent:
+                return
+            if sent:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _drain_once(self, bot: Bot) -> int:
+        rows = await claim_outbox(self.batch_size, self.lease)
+        self._leased.update(row[0] for row in rows)
+        chats = [list(g) for _, g in groupby(sorted(rows, key=lambda r: (r[1], r[0])), key=lambda r: r[1])]
+        await asyncio.gather(*(self._deliver_chat(bot, chat_rows) for chat_rows in chats))
+        return len(rows)
+
+    async def _deliver_chat(self, bot: Bot, rows: List[Tuple[int, int, str, str, int]]) -> None:
+        # Messages for one chat go out in id order. When one fails, the rest
+        # of the chat's batch is put back so nothing overtakes it.
+        for i, (entry_id, chat_id, name, payload, attempts) in enumerate(rows):
+            try:
+                await notifier.send(bot, unpack(name, payload))
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                print(f"Outbox message {entry_id} to {chat_id} dropped:", e)
+                await fail_outbox([entry_id], str(e))
+                self._leased.discard(entry_id)
+                continue
+            except Exception as e:
+                later = [r[0] for r in rows[i + 1:]]
+                if attempts >= self.max_attempts:
+                    print(f"Outbox message {entry_id} to {chat_id} failed:", e)
+                    await fail_outbox([entry_id], str(e))
+                else:
+                    await retry_outbox([entry_id], min(2 ** attempts, 300), str(e))
+                await release_outbox(later)
+                self._leased.difference_update([entry_id, *later])
+                return
+            await ack_outbox([entry_id])
+            self._leased.discard(entry_id)
+
+
+outbox_worker = OutboxWorker()
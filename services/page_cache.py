@@ -0,0 +1,47 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from config import HISTORY_CACHE_SIZE
+from database import get_counter
+from services.metrics import PAGE_CACHE
+
+
+class PageCache:
+    # Rendered pages keyed by (data version, page key). The version is a
+    # database counter that triggers bump on every write the pages show, so
+    # it is read on each view: one primary-key lookup buys freshness across
+    # worker processes. It is read before rendering, so a write racing the
+    # render can only leave newer data under an older version, never the
+    # other way round.
+
+    def __init__(self, name: str, counter: str, maxsize: int):
+        self.name = name
+        self.counter = counter
+        self.maxsize = maxsize
+        self.generation = 0
+        self._pages: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    async def get(self, key: Hashable, render: Callable[[], Awaitable[Any]]) -> Any:
+        generation = await get_counter(self.counter)
+        if generation > self.generation:
+            self._pages.clear()
+            self.generation = generation
+        key = (generation, key)
+        page = self._pages.get(key)
+        if page is not None:
+            self._pages.move_to_end(key)
+            PAGE_CACHE.inc(self.name, "hit")
+            return page
+        PAGE_CACHE.inc(self.name, "miss")
+        page = await render()
+        if generation == self.generation:
+            self._pages[key] = page
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+        return page
+
+    def clear(self) -> None:
+        self._pages.clear()
+
+
+hr_history_cache = PageCache("hr_history", "history", HISTORY_CACHE_SIZE)
@@ -0,0 +1,108 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import PENDING_CATEGORY_PRIORITY
+from database import get_pending_items, subscribe
+
+PENDING = "Відправлено"
+
+# (section, priority, created_at, id): requests before feedback, then by
+# category priority, then oldest first
+SortKey = Tuple[int, int, str, int]
+
+
+class PendingIndex:
+    # Pending requests and unanswered feedback, kept sorted in memory so the
+    # HR queue is served without a query. Built from the database at startup
+    # and then maintained from the write listeners; the database stays the
+    # source of truth. Lookups are O(log n); add and remove are O(n) since
+    # they shift a plain list, which is a memmove of a few microseconds at
+    # the queue sizes an HR team works with.
+
+    counter = "pending"
+
+    def __init__(self, category_priority: List[str] = PENDING_CATEGORY_PRIORITY):
+        self._priority = {cat: i for i, cat in enumerate(category_priority)}
+        self._keys: List[SortKey] = []
+        # (kind, id) -> (sort key, (kind, id, number, user_id, category, text, created_at))
+        self._items: Dict[Tuple[str, int], Tuple[SortKey, Tuple]] = {}
+        self.generation = 0
+
+    def _key(self, row: Tuple) -> SortKey:
+        kind, item_id, _, _, category, _, created_at = row
+        if kind == "r":
+            return 0, self._priority.get(category, len(self._priority)), created_at, item_id
+        return 1, 0, created_at, item_id
+
+    async def load(self) -> None:
+        rows, generation = await get_pending_items()
+        self._items = {(row[0], row[1]): (self._key(row), row) for row in rows}
+        self._keys = sorted(key for key, _ in self._items.values())
+        self.generation = generation
+
+    def add(self, row: Tuple) -> None:
+        ref = (row[0], row[1])
+        if ref in self._items:
+            return
+        key = self._key(row)
+        self._items[ref] = (key, row)
+        insort(self._keys, key)
+
+    def remove(self, kind: str, item_id: int) -> None:
+        entry = self._items.pop((kind, item_id), None)
+        if entry is None:
+            return
+        i = bisect_left(self._keys, entry[0])
+        if i < len(self._keys) and self._keys[i] == entry[0]:
+            del self._keys[i]
+
+    def _row(self, key: SortKey) -> Tuple:
+        return self._items[("r" if key[0] == 0 else "f", key[3])][1]
+
+    def count(self) -> int:
+        return len(self._keys)
+
+    def page(self, offset: int, limit: int) -> List[Tuple]:
+        return [self._row(key) for key in self._keys[offset:offset + limit]]
+
+    def next_after(self, kind: str, item_id: int) -> Optional[Tuple]:
+        # The item that follows (kind, item_id) in queue order, wrapping
+        # around; if that item is no longer pending, the head of the queue.
+        if not self._keys:
+            return None
+        entry = self._items.get((kind, item_id))
+        i = bisect_right(self._keys, entry[0]) if entry else 0
+        return self._row(self._keys[i % len(self._keys)])
+
+    def _on_add_request(self, row: Optional[Tuple], args: Dict[str, Any]) -> None:
+        item_id, number, user_id, _, created_at = row
+        self.add(("r", item_id, number, user_id, args["category"], args["text"], created_at))
+
+    def _on_update_request_status(self, row: Optional[Tuple], args: Dict[str, Any]) -> None:
+        if row is not None and row[3] != PENDING:
+            self.remove("r", row[0])
+
+    def _on_add_anonymous_feedback(self, row: Optional[Tuple], args: Dict[str, Any]) -> None:
+        item_id, user_id, created_at = row
+        self.add(("f", item_id, None, user_id, None, args["text"], created_at))
+
+    def _on_add_feedback_response(self, row: Optional[Tuple], args: Dict[str, Any]) -> None:
+        if row is not None:
+            self.remove("f", row[0])
+
+    def _on_delete_user(self, _, args: Dict[str, Any]) -> None:
+        # A scan, but employees are deleted rarely
+        user_id = args["telegram_id"]
+        for ref in [ref for ref, (_, row) in self._items.items() if ref[0] == "r" and row[3] == user_id]:
+            self.remove(*ref)
+
+    def bind(self) -> None:
+        subscribe("add_request", self._on_add_request)
+        subscribe("update_request_status", self._on_update_request_status)
+        subscribe("add_anonymous_feedback", self._on_add_anonymous_feedback)
+        subscribe("add_feedback_response", self._on_add_feedback_response)
+        subscribe("delete_user", self._on_delete_user)
+
+
+pending_index = PendingIndex()
+pending_index.bind()
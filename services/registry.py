@@ -0,0 +1,80 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import get_users_and_roles, subscribe
+
+
+class Registry:
+    # Registered users and their roles, kept in memory so that authorization
+    # checks never touch the database. Loaded once at startup and kept
+    # current by the database write listeners below.
+
+    counter = "registry"
+
+    def __init__(self):
+        self._users: Dict[int, Tuple] = {}
+        self._roles: Dict[int, str] = {}
+        self._hr_ids: Optional[List[int]] = None
+        self.generation = 0
+
+    async def load(self) -> None:
+        users, roles, generation = await get_users_and_roles()
+        self._users = {row[0]: row for row in users}
+        self._roles = dict(roles)
+        self._hr_ids = None
+        self.generation = generation
+
+    def user(self, telegram_id: int) -> Optional[Tuple]:
+        return self._users.get(telegram_id)
+
+    def is_registered(self, telegram_id: int) -> bool:
+        return telegram_id in self._users
+
+    def role(self, telegram_id: int) -> Optional[str]:
+        return self._roles.get(telegram_id)
+
+    def is_hr(self, telegram_id: int) -> bool:
+        return self._roles.get(telegram_id) == "hr"
+
+    def hr_ids(self) -> List[int]:
+        if self._hr_ids is None:
+            self._hr_ids = [uid for uid, role in self._roles.items() if role == "hr"]
+        return list(self._hr_ids)
+
+    def _set_role(self, telegram_id: int, role: Optional[str]) -> None:
+        if role is None:
+            self._roles.pop(telegram_id, None)
+        else:
+            self._roles[telegram_id] = role
+        self._hr_ids = None
+
+    def _on_add_user(self, _, args: Dict[str, Any]) -> None:
+        uid = args["telegram_id"]
+        self._users[uid] = (uid, args["full_name"], args["department"], args["position"], args["username"])
+
+    def _on_update_user_info(self, _, args: Dict[str, Any]) -> None:
+        row = self._users.get(args["telegram_id"])
+        if row is not None:
+            self._users[row[0]] = (row[0], args["full_name"], args["department"], args["position"], *row[4:])
+
+    def _on_set_username(self, _, args: Dict[str, Any]) -> None:
+        row = self._users.get(args["telegram_id"])
+        if row is not None:
+            self._users[row[0]] = (*row[:4], args["username"])
+
+    def _on_add_hr(self, _, args: Dict[str, Any]) -> None:
+        self._set_role(args["telegram_id"], "hr")
+
+    def _on_delete_user(self, _, args: Dict[str, Any]) -> None:
+        self._users.pop(args["telegram_id"], None)
+        self._set_role(args["telegram_id"], None)
+
+    def bind(self) -> None:
+        subscribe("add_user", self._on_add_user)
+        subscribe("update_user_info", self._on_update_user_info)
+        subscribe("set_username", self._on_set_username)
+        subscribe("add_hr", self._on_add_hr)
+        subscribe("delete_user", self._on_delete_user)
+
+
+registry = Registry()
+registry.bind()
@@ -0,0 +1,44 @@
+import html
+import re
+import unicodedata
+from typing import Optional, Sequence
+
+_WORD = re.compile(r"\w+")
+
+
+def _fold(word: str) -> str:
+    # Close to the FTS5 unicode61 tokenizer with remove_diacritics
+    decomposed = unicodedata.normalize("NFD", word.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def snippet(texts: Sequence[Optional[str]], query: str, words: int = 12, markup: bool = True) -> str:
+    # A window of the first text with a match, matched words in bold. The
+    # words are matched as prefixes, the same way search_items queries.
+    prefixes = [_fold(w) for w in _WORD.findall(query)]
+    for text in texts:
+        if not text:
+            continue
+        tokens = list(_WORD.finditer(text))
+        hits = {i for i, m in enumerate(tokens) if any(_fold(m.group()).startswith(p) for p in prefixes)}
+        if not hits:
+            continue
+        start = max(min(hits) - words // 3, 0)
+        end = min(start + words, len(tokens))
+        parts = ["…"] if start > 0 else []
+        pos = tokens[start].start()
+        for i in range(start, end):
+            m = tokens[i]
+            word = m.group()
+            if markup:
+                parts.append(html.escape(text[pos:m.start()]))
+                parts.append(f"<b>{html.escape(word)}</b>" if i in hits else html.escape(word))
+            else:
+                parts.append(text[pos:m.start()] + word)
+            pos = m.end()
+        if end < len(tokens):
+            parts.append("…")
+        return "".join(parts)
+    text = next((t for t in texts if t), "")
+    short = text if len(text) <= 100 else text[:100] + "…"
+    return html.escape(short) if markup else short
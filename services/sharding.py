@@ -0,0 +1,154 @@
+import asyncio
+import multiprocessing
+import signal
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import TelegramObject, Update, User
+
+from config import BOT_TOKEN, CACHE_POLL_INTERVAL, METRICS_PORT
+
+# Worker processes are started with "spawn" so none of them inherits the
+# front process' event loop, database threads or open connections.
+_context = multiprocessing.get_context("spawn")
+
+
+def shard_of(user_id: int, shards: int) -> int:
+    return user_id % shards
+
+
+class ShardRouter(BaseMiddleware):
+    # Outer update middleware of the front process: instead of handling an
+    # update it forwards it to the worker that owns the sender. Every update
+    # of one user lands in the same worker queue, in arrival order.
+
+    def __init__(self, queues: List[Any]):
+        self.queues = queues
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        chat = data.get("event_chat")
+        key = user.id if user else chat.id if chat else 0
+        self.queues[shard_of(key, len(self.queues))].put(
+            event.model_dump_json(exclude_unset=True)
+        )
+
+
+class OrderedFeeder:
+    # Runs updates of different users concurrently while keeping each user's
+    # updates strictly sequential, so FSM transitions never interleave.
+
+    def __init__(self, feed: Callable[[Update], Awaitable[Any]]):
+        self.feed = feed
+        self._tails: Dict[int, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _run(self, previous: Optional[asyncio.Task], update: Update) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await self.feed(update)
+        except Exception as e:
+            print(f"Update {update.update_id} failed:", e)
+
+    def submit(self, key: int, update: Update) -> None:
+        task = asyncio.create_task(self._run(self._tails.get(key), update))
+        self._tails[key] = task
+        self._tasks.add(task)
+
+        def done(t: asyncio.Task) -> None:
+            self._tasks.discard(t)
+            if self._tails.get(key) is t:
+                del self._tails[key]
+        task.add_done_callback(done)
+
+    async def join(self) -> None:
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+
+def _update_key(update: Update) -> int:
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, "chat", None) or getattr(getattr(event, "message", None), "chat", None)
+    return chat.id if chat is not None else 0
+
+
+async def _watch_generations(caches: List[Any], interval: float) -> None:
+    # Writes made by other workers never reach this process' listeners, so
+    # poll the generation counters bumped by database triggers and reload a
+    # cache when its counter has moved.
+    from database import get_counter
+
+    while True:
+        await asyncio.sleep(interval)
+        for cache in caches:
+            try:
+                if await get_counter(cache.counter) != cache.generation:
+                    await cache.load()
+            except Exception as e:
+                print(f"Reload of {cache.counter} failed:", e)
+
+
+async def _worker_main(index: int, queue: Any) -> None:
+    from bot import create_dispatcher
+    from database import init_db, close_db
+    from services.directory import directory
+    from services.pending_index import pending_index
+    from services.registry import registry
+
+    init_db()
+    bot = Bot(token=BOT_TOKEN)
+    dp = create_dispatcher(metrics_port=METRICS_PORT + 1 + index if METRICS_PORT else 0)
+    await dp.emit_startup(bot=bot)
+    watcher = asyncio.create_task(_watch_generations([registry, directory, pending_index], CACHE_POLL_INTERVAL))
+    feeder = OrderedFeeder(lambda update: dp.feed_update(bot, update))
+    loop = asyncio.get_running_loop()
+    print(f"⚙️ Воркер {index} запущено")
+    try:
+        while True:
+            payload = await loop.run_in_executor(None, queue.get)
+            if payload is None:
+                break
+            update = Update.model_validate_json(payload, context={"bot": bot})
+            feeder.submit(_update_key(update), update)
+        await feeder.join()
+    finally:
+        watcher.cancel()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+        close_db()
+
+
+def _worker_process(index: int, queue: Any) -> None:
+    # Ctrl+C reaches the whole process group; the front process decides
+    # when workers stop, after they have drained their queues.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_main(index, queue))
+
+
+class WorkerPool:
+    def __init__(self, workers: int):
+        self.queues = [_context.Queue() for _ in range(workers)]
+        self.processes = [
+            _context.Process(target=_worker_process, args=(i, q), name=f"hr_bot_worker_{i}")
+            for i, q in enumerate(self.queues)
+        ]
+
+    def start(self) -> None:
+        for process in self.processes:
+            process.start()
+
+    def stop(self) -> None:
+        # Workers finish everything already queued before exiting.
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join()
@@ -28,3 +28,11 @@ class EditUserState(StatesGroup):
     waiting_full_name = State()
     waiting_department = State()
     waiting_position = State()
+
+
+class DirectoryState(StatesGroup):
+    search = State()
+
+
+class SearchState(StatesGroup):
+    query = State()